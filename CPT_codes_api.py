@@ -1,8 +1,9 @@
 from flask import Flask, request, jsonify
-from cortex import AsyncCortexClient, Filter, Field
-from sentence_transformers import SentenceTransformer
+from cortex_pool import pool_stats
+from cpt_lookup import CPT_LOOKUP_MAX_CODES, get_cpt_lookup
 from groq import Groq
-import asyncio
+from llm_cache import UnparsableCompletion, cached_completion, llm_cache_stats
+from pricing import get_cost_estimates_batch, lookup_precomputed
 import os
 import json
 
@@ -12,29 +13,6 @@ app = Flask(__name__)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 groq_client = Groq(api_key=GROQ_API_KEY)
 
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Reuse a single event loop to avoid gRPC too_many_pings
-_loop = asyncio.new_event_loop()
-
-
-# -----------------------------
-# Vector DB Lookup
-# -----------------------------
-async def fetch_cpt_from_vector_db(cpt_code: str):
-    async with AsyncCortexClient("localhost:50051") as client:
-        # Use the CPT code as the query text; filter ensures exact code match
-        query_vector = embed_model.encode(cpt_code).tolist()
-        cpt_filter = Filter().must(Field("cpt_code").eq(cpt_code))
-        results = await client.search(
-            "cpt_codes",
-            query_vector,
-            top_k=1,
-            filter=cpt_filter,
-            with_payload=True,
-        )
-    return results
-
 
 # -----------------------------
 # Groq Cost Estimation
@@ -61,18 +39,17 @@ Return ONLY valid JSON like:
 }}
 """
 
-    response = groq_client.chat.completions.create(
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
-
-    content = response.choices[0].message.content or ""
-
     try:
-        return json.loads(content)
-    except Exception:
-        return {"error": "Failed to parse Groq response", "raw": content}
+        return cached_completion(
+            "cpt_api_cost_estimate",
+            groq_client,
+            parse=json.loads,
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+        )
+    except UnparsableCompletion as e:
+        return {"error": "Failed to parse Groq response", "raw": e.content}
 
 
 # -----------------------------
@@ -86,22 +63,21 @@ def estimate_cost_api():
     if not data or "cpt_code" not in data:
         return jsonify({"error": "Please provide a CPT code"}), 400
 
-    cpt_code = str(data["cpt_code"]).strip()
-
     try:
-        results = _loop.run_until_complete(fetch_cpt_from_vector_db(cpt_code))
+        row = get_cpt_lookup().get(data["cpt_code"])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    if not results:
+    if row is None:
         return jsonify({"error": "CPT code not found"}), 404
 
-    r = results[0]
-    payload = r.payload or {}
-    description = payload.get("procedure_code_description", "")
-    category = payload.get("procedure_code_category", "")
+    cpt_code = row["cpt_code"]
+    description = row["procedure_code_description"]
+    category = row["procedure_code_category"]
 
-    estimate = get_cost_estimate_from_groq(cpt_code, description, category)
+    estimate = lookup_precomputed(cpt_code) or get_cost_estimate_from_groq(
+        cpt_code, description, category
+    )
 
     return jsonify(
         {
@@ -113,5 +89,68 @@ def estimate_cost_api():
     )
 
 
+@app.route("/estimate-cost/batch", methods=["POST"])
+def estimate_cost_batch_api():
+
+    data = request.get_json(silent=True) or {}
+    codes = data.get("cpt_codes")
+
+    if not isinstance(codes, list) or not codes:
+        return jsonify({"error": "Please provide a non-empty cpt_codes list"}), 400
+
+    if len(codes) > CPT_LOOKUP_MAX_CODES:
+        return (
+            jsonify({"error": f"At most {CPT_LOOKUP_MAX_CODES} codes per request"}),
+            400,
+        )
+
+    codes = [str(c).strip() for c in codes]
+
+    try:
+        rows = get_cpt_lookup().get_many(codes)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # Key by the catalog's code, so "0585t" and "0585T" are priced once and
+    # hit the precomputed table; results still follow the input order.
+    payloads = {row["cpt_code"]: row for row in rows if row is not None}
+    items = [
+        (
+            code,
+            payload.get("procedure_code_description", ""),
+            payload.get("procedure_code_category", ""),
+        )
+        for code, payload in payloads.items()
+    ]
+    # One multi-code completion per chunk instead of one call per code
+    estimates = dict(zip(payloads, get_cost_estimates_batch(items)))
+
+    results = []
+    for code, row in zip(codes, rows):
+        if row is None:
+            results.append({"cpt_code": code, "error": "CPT code not found"})
+            continue
+        results.append(
+            {
+                "cpt_code": row["cpt_code"],
+                "procedure_description": row.get("procedure_code_description", ""),
+                "category": row.get("procedure_code_category", ""),
+                "estimated_cost": estimates[row["cpt_code"]],
+            }
+        )
+
+    return jsonify({"results": results})
+
+
+@app.route("/cortex-stats", methods=["GET"])
+def cortex_stats_api():
+    return jsonify(pool_stats())
+
+
+@app.route("/llm-cache-stats", methods=["GET"])
+def llm_cache_stats_api():
+    return jsonify(llm_cache_stats())
+
+
 if __name__ == "__main__":
     app.run(debug=True)
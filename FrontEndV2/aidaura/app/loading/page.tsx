@@ -22,6 +22,7 @@ const STEPS: Step[] = [
 export default function LoadingPage() {
   const router = useRouter()
   const [states, setStates] = useState<StepState[]>(['pending', 'pending', 'pending'])
+  const [costProgress, setCostProgress] = useState('')
   const started = useRef(false)
 
   useEffect(() => {
@@ -39,6 +40,10 @@ export default function LoadingPage() {
           else n[step] = 'error'
           return n
         })
+      }, partial => {
+        // Costs stream in one by one after the search returns
+        const priced = partial.filter(r => r.estimated_cost).length
+        setCostProgress(partial.length > 0 ? ` (${priced}/${partial.length})` : '')
       })
 
       // Navigate to results after a brief pause so user sees final state
@@ -115,6 +120,7 @@ export default function LoadingPage() {
                   <div>
                     <span className={`text-lg ${state === 'done' ? 'font-bold text-slate-900' : state === 'error' ? 'font-medium text-amber-600' : 'font-medium text-slate-500'}`}>
                       {state === 'done' ? step.doneLabel : state === 'error' ? 'Partial data' : step.label}
+                      {i === 0 && state === 'active' && costProgress}
                     </span>
                     {state === 'done' && (
                       <p className="text-xs text-slate-400 mt-0.5">{step.detail}</p>
@@ -6,6 +6,7 @@ import Header from '@/components/Header'
 import Footer from '@/components/Footer'
 import {
   fetchAllResults,
+  pricedCost,
   readSessionJSON,
   type CptResultItem as CptResult,
   type FplDataItem as FplData,
@@ -141,9 +142,16 @@ export default function ResultsPage() {
   const [expandedPath, setExpandedPath] = useState<number | null>(null)
   const [detailOption, setDetailOption] = useState<RankedOption | null>(null)
   const [isLoading, setIsLoading] = useState(true)
+  // Set once no more estimates can arrive; anything unpriced then is unavailable
+  const [pricingDone, setPricingDone] = useState(false)
   const [fetchError, setFetchError] = useState('')
   const fetching = useRef(false)
 
+  const showPartialCpt = (partial: CptResult[]) => {
+    setCptResults(partial)
+    if (partial.length > 0) setIsLoading(false)
+  }
+
   useEffect(() => {
     if (fetching.current) return
     fetching.current = true
@@ -171,6 +179,7 @@ export default function ResultsPage() {
       setCptResults(cachedCpt)
       setFplData(cachedFpl)
       if (cachedRank) setRankedOptions(cachedRank)
+      setPricingDone(true)
       setIsLoading(false)
       return
     }
@@ -184,9 +193,10 @@ export default function ResultsPage() {
       return
     }
 
-    // 4. Fallback: fetch from backend APIs
+    // 4. Fallback: fetch from backend APIs, rendering codes as soon as the
+    // search returns and filling in each cost as it streams in
     setFetchError('')
-    fetchAllResults()
+    fetchAllResults(undefined, showPartialCpt)
       .then(({ cptResults: cpt, fplData: fpl, rankedOptions: ranked }) => {
         if (cpt) setCptResults(cpt)
         if (fpl) setFplData(fpl)
@@ -198,13 +208,23 @@ export default function ResultsPage() {
       .catch(() => {
         setFetchError('Something went wrong while fetching your results. Please try again.')
       })
-      .finally(() => setIsLoading(false))
+      .finally(() => {
+        setPricingDone(true)
+        setIsLoading(false)
+      })
   }, [router])
 
   // ── Derived values ──
 
-  const totalOutOfNetwork = cptResults?.reduce((s, r) => s + r.estimated_cost.out_of_network, 0) ?? 0
-  const totalInNetwork = cptResults?.reduce((s, r) => s + r.estimated_cost.in_network, 0) ?? 0
+  const totalOutOfNetwork = cptResults?.reduce((s, r) => s + (pricedCost(r)?.out_of_network ?? 0), 0) ?? 0
+  const totalInNetwork = cptResults?.reduce((s, r) => s + (pricedCost(r)?.in_network ?? 0), 0) ?? 0
+  const pendingCosts = pricingDone ? 0 : cptResults?.filter(r => !r.estimated_cost).length ?? 0
+  const unavailableCosts = (cptResults?.filter(r => !pricedCost(r)).length ?? 0) - pendingCosts
+  const costLabel = (r: CptResult) => {
+    const cost = pricedCost(r)
+    if (cost) return fmt(cost.out_of_network)
+    return r.estimated_cost || pricingDone ? 'Unavailable' : 'Estimating\u2026'
+  }
 
   const situationLower = situation.toLowerCase()
   const isComplex = HIGH_COMPLEXITY_KEYWORDS.some(kw => situationLower.includes(kw))
@@ -229,8 +249,9 @@ export default function ResultsPage() {
 
   const retryFetch = () => {
     setIsLoading(true)
+    setPricingDone(false)
     setFetchError('')
-    fetchAllResults()
+    fetchAllResults(undefined, showPartialCpt)
       .then(({ cptResults: cpt, fplData: fpl, rankedOptions: ranked }) => {
         if (cpt) setCptResults(cpt)
         if (fpl) setFplData(fpl)
@@ -242,7 +263,10 @@ export default function ResultsPage() {
       .catch(() => {
         setFetchError('Something went wrong while fetching your results. Please try again.')
       })
-      .finally(() => setIsLoading(false))
+      .finally(() => {
+        setPricingDone(true)
+        setIsLoading(false)
+      })
   }
 
   // ── Loading state ──
@@ -355,11 +379,15 @@ export default function ResultsPage() {
                 {cptResults.map((r, i) => (
                   <div key={i} className="flex justify-between">
                     <span className="truncate mr-2">{r.procedure_code_description}</span>
-                    <span className="font-semibold text-slate-700 whitespace-nowrap">{fmt(r.estimated_cost.out_of_network)}</span>
+                    <span className="font-semibold text-slate-700 whitespace-nowrap">{costLabel(r)}</span>
                   </div>
                 ))}
                 <div className="flex justify-between border-t border-slate-200/50 pt-1.5 mt-1.5 font-bold text-slate-800">
-                  <span>Total</span>
+                  <span>
+                    {pendingCosts > 0
+                      ? `Total so far (${pendingCosts} pending)`
+                      : unavailableCosts > 0 ? `Total (${unavailableCosts} unavailable)` : 'Total'}
+                  </span>
                   <span>{fmt(totalOutOfNetwork)}</span>
                 </div>
               </>
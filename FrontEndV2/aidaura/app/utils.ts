@@ -99,16 +99,33 @@ export function getInsurancePayload(): Record<string, unknown> | null {
 
 // ── API fetch orchestration (used by /loading primarily, fallback in /results) ──
 
+export interface CostEstimateItem {
+    in_network: number;
+    out_of_network: number;
+    reasoning: string;
+}
+
+/**
+ * A code that could not be priced. /api/cpt/pricing still answers 200 and
+ * sends this in place of that code's estimate (see pricing.price_one).
+ */
+export interface CostEstimateError {
+    error: string;
+}
+
 export interface CptResultItem {
     cpt_code: string;
     procedure_code_description: string;
     procedure_code_category: string;
     score: number;
-    estimated_cost: {
-        in_network: number;
-        out_of_network: number;
-        reasoning: string;
-    };
+    /** Missing while a streamed estimate is still being priced. */
+    estimated_cost?: CostEstimateItem | CostEstimateError;
+}
+
+/** The cost estimate, or null while it is pending or if pricing failed. */
+export function pricedCost(item: CptResultItem): CostEstimateItem | null {
+    const cost = item.estimated_cost;
+    return cost && !("error" in cost) ? cost : null;
 }
 
 export interface FplDataItem {
@@ -133,15 +150,105 @@ export interface FetchedResults {
     rankedOptions: RankedOptionItem[] | null;
 }
 
+// ── Streaming CPT pricing ──
+
+interface CptStreamEvent {
+    event: "results" | "estimate" | "done" | "error";
+    results?: CptResultItem[];
+    index?: number;
+    estimated_cost?: CostEstimateItem | CostEstimateError;
+    error?: string;
+}
+
+/** Read an NDJSON response body, calling onEvent for each line as it arrives. */
+export async function readNdjson<T>(
+    res: Response,
+    onEvent: (event: T) => void,
+): Promise<void> {
+    if (!res.body) {
+        for (const line of (await res.text()).split("\n")) {
+            if (line.trim()) onEvent(JSON.parse(line) as T);
+        }
+        return;
+    }
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value, { stream: !done });
+        const lines = buffer.split("\n");
+        buffer = lines.pop() ?? "";
+        for (const line of lines) {
+            if (line.trim()) onEvent(JSON.parse(line) as T);
+        }
+        if (done) break;
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer) as T);
+}
+
+/**
+ * POST /api/cpt/pricing in streaming mode. The ranked codes arrive first and
+ * each cost estimate follows as soon as it is priced.
+ *
+ * @param onUpdate Called with a fresh copy of the results after every event
+ * @returns The final results, or null if the search itself failed
+ * @throws If the server reports an error mid-stream or the stream ends
+ *   before its "done" event
+ */
+export async function streamCptPricing(
+    body: Record<string, unknown>,
+    onUpdate?: (results: CptResultItem[]) => void,
+): Promise<CptResultItem[] | null> {
+    const res = await fetch(`${API_BASE}/api/cpt/pricing`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ...body, stream: "ndjson" }),
+    });
+    if (!res.ok) return null;
+
+    let results: CptResultItem[] | null = null;
+    let complete = false;
+    await readNdjson<CptStreamEvent>(res, (event) => {
+        if (event.event === "error") {
+            throw new Error(event.error || "CPT pricing stream failed");
+        }
+        if (event.event === "done") {
+            complete = true;
+            return;
+        }
+        if (event.event === "results") {
+            results = event.results || [];
+        } else if (
+            event.event === "estimate" &&
+            results &&
+            event.index !== undefined
+        ) {
+            results = results.map((r, i) =>
+                i === event.index
+                    ? { ...r, estimated_cost: event.estimated_cost }
+                    : r,
+            );
+        } else {
+            return;
+        }
+        onUpdate?.(results);
+    });
+    if (!complete) throw new Error("CPT pricing stream ended early");
+    return results;
+}
+
 /**
  * Run all three backend calls (CPT pricing, FPL discount, rank options)
  * and persist results to sessionStorage.
  *
  * @param onStep Optional callback for progress updates: step 0/1 = parallel CPT+FPL, step 2 = ranking
+ * @param onCptUpdate Optional callback with partial CPT results as estimates stream in
  * @returns The fetched data bundle
  */
 export async function fetchAllResults(
     onStep?: (step: number, status: "start" | "done" | "error") => void,
+    onCptUpdate?: (results: CptResultItem[]) => void,
 ): Promise<FetchedResults> {
     const situation = sessionStorage.getItem("aidaura_situation") || "";
     const income = parseFloat(
@@ -153,54 +260,52 @@ export async function fetchAllResults(
     );
     const insuranceData = getInsurancePayload();
 
-    let cptResults: CptResultItem[] | null = null;
-    let fplData: FplDataItem | null = null;
-
     // Steps 1 & 2 (parallel): CPT pricing + FPL discount
     onStep?.(0, "start");
     onStep?.(1, "start");
 
-    try {
-        const [cptRes, fplRes] = await Promise.all([
-            fetch(`${API_BASE}/api/cpt/pricing`, {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({
-                    reason: situation,
-                    score_threshold: 0.2,
-                    top_k: 12,
-                }),
-            }),
-            fetch(`${API_BASE}/fpl-discount`, {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ income, household_size: familySize }),
-            }),
-        ]);
-
-        if (cptRes.ok) {
-            const cptData = await cptRes.json();
-            cptResults = cptData.results || [];
-            sessionStorage.setItem(
-                "aidaura_cpt_results",
-                JSON.stringify(cptResults),
-            );
-            onStep?.(0, "done");
-        } else {
+    const cptTask: Promise<CptResultItem[] | null> = streamCptPricing(
+        { reason: situation, score_threshold: 0.2, top_k: 12 },
+        onCptUpdate,
+    )
+        .then((results) => {
+            if (results) {
+                sessionStorage.setItem(
+                    "aidaura_cpt_results",
+                    JSON.stringify(results),
+                );
+                onStep?.(0, "done");
+            } else {
+                onStep?.(0, "error");
+            }
+            return results;
+        })
+        .catch(() => {
             onStep?.(0, "error");
-        }
+            return null;
+        });
 
-        if (fplRes.ok) {
-            fplData = await fplRes.json();
-            sessionStorage.setItem("aidaura_fpl_data", JSON.stringify(fplData));
+    const fplTask: Promise<FplDataItem | null> = fetch(`${API_BASE}/fpl-discount`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ income, household_size: familySize }),
+    })
+        .then(async (fplRes) => {
+            if (!fplRes.ok) {
+                onStep?.(1, "error");
+                return null;
+            }
+            const data: FplDataItem = await fplRes.json();
+            sessionStorage.setItem("aidaura_fpl_data", JSON.stringify(data));
             onStep?.(1, "done");
-        } else {
+            return data;
+        })
+        .catch(() => {
             onStep?.(1, "error");
-        }
-    } catch {
-        onStep?.(0, "error");
-        onStep?.(1, "error");
-    }
+            return null;
+        });
+
+    const [cptResults, fplData] = await Promise.all([cptTask, fplTask]);
 
     // Step 3 (sequential): rank options
     let rankedOptions: RankedOptionItem[] | null = null;
@@ -209,11 +314,11 @@ export async function fetchAllResults(
     if (cptResults && fplData) {
         try {
             const totalInNetwork = cptResults.reduce(
-                (sum, r) => sum + parseMoney(r.estimated_cost?.in_network),
+                (sum, r) => sum + parseMoney(pricedCost(r)?.in_network),
                 0,
             );
             const totalOutNetwork = cptResults.reduce(
-                (sum, r) => sum + parseMoney(r.estimated_cost?.out_of_network),
+                (sum, r) => sum + parseMoney(pricedCost(r)?.out_of_network),
                 0,
             );
             const insuranceOop = computeInsuranceOop(
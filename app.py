@@ -3,59 +3,81 @@ Simple Flask API Template
 A basic Flask API with common patterns for building RESTful APIs.
 """
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from datetime import datetime
-from functools import wraps
-import os
-import json
-from dotenv import load_dotenv
-from groq import Groq
-from pydantic import BaseModel
-from vision_ocr_api import (
-    InsuranceId,
-    MODEL_NAME,
-    PROMPT_TEXT,
-    get_client,
-    normalize_base64,
-)
-from cpt_search import search_cpt_by_reason
+from startup_timing import mark_ready, phase, startup_report
+
+with phase("import:flask"):
+    from flask import Flask, Response, request, jsonify, stream_with_context
+    from flask_cors import CORS
+    from datetime import datetime
+    from functools import wraps
+    import os
+    import json
+    import threading
+    import time
+    from dotenv import load_dotenv
+with phase("import:vision_ocr_api"):
+    from vision_ocr_api import (
+        InsuranceId,
+        MODEL_NAME,
+        PROMPT_TEXT,
+        get_client,
+        normalize_base64,
+    )
+with phase("import:cpt_search"):
+    from cpt_search import (
+        SEARCH_BACKENDS,
+        SEARCH_MODES,
+        search_cpt_by_reason,
+        search_cpt_with_meta,
+    )
+    from category_router import router_stats
+    from embedding_service import embedding_stats, preload as preload_embedding_model
+    from llm_cache import (
+        INSURANCE_CACHE_TTL_SECONDS,
+        cached_completion,
+        llm_cache_stats,
+    )
+with phase("import:pricing"):
+    from pricing import (
+        DEFAULT_PRICING_MODE,
+        PRICING_MODES,
+        iter_price_results,
+        price_results,
+    )
+    from cortex_pool import pool_stats
+    from procedure_catalog import get_catalog, load_catalog
+    from cpt_lookup import CPT_LOOKUP_MAX_CODES, get_cpt_lookup
+with phase("import:screening"):
+    from fpl_batch import (
+        FPL_BASE,
+        FPL_BATCH_MAX_ROWS,
+        FPL_PER_EXTRA,
+        compute_fpl_batch,
+        get_discount,
+        parse_households,
+        to_json_columns,
+    )
+    from rank_engine import RANK_BATCH_MAX_SCENARIOS, rank_batch, rank_scenario
+    from rank_montecarlo import simulate_options
+    from charity_model import (
+        CHARITY_BATCH_MAX_PATIENTS,
+        get_charity_model,
+        predict_patients,
+    )
+with phase("import:warmup"):
+    from warmup import readiness, start_warm_up
 
 load_dotenv()  # Load environment variables from .env file
 
-_groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-
-GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
-
-
-class CostEstimate(BaseModel):
-    in_network: float
-    out_of_network: float
-    reasoning: str
-
-
-def get_cost_estimate_from_groq(cpt_code: str, description: str, category: str) -> dict:
-    prompt = (
-        f"You are a US healthcare billing estimator.\n\n"
-        f"CPT Code: {cpt_code}\n"
-        f"Procedure Description: {description}\n"
-        f"Category: {category}\n\n"
-        f"Provide realistic estimated costs in USD for in_network and out_of_network."
-    )
-    response = _groq_client.chat.completions.create(
-        model=GROQ_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "cost_estimate",
-                "schema": CostEstimate.model_json_schema(),
-            },
-        },
-        temperature=0.3,
-    )
-    content = response.choices[0].message.content or ""
-    return CostEstimate.model_validate_json(content).model_dump()
+# Wire formats for the "stream" option of the CPT endpoints.
+STREAM_FORMATS = ("ndjson", "sse")
+# When to load the embedding model: "background" (a thread at import, so
+# /health answers immediately), "eager" (block the import) or "lazy" (first
+# search). gunicorn.conf.py preloads it in the master regardless.
+EMBED_PRELOAD = os.environ.get("EMBED_PRELOAD", "background")
+# Warm up (model, Cortex, catalog, caches) in a thread at import. gunicorn.conf.py
+# turns this off and warms each worker after fork instead.
+WARMUP_ON_IMPORT = os.environ.get("WARMUP_ON_IMPORT", "1") == "1"
 
 
 app = Flask(__name__)
@@ -104,6 +126,13 @@ def require_json(f):
 # ==================== Health Check ====================
 
 
+@app.route("/ready", methods=["GET"])
+def ready_check():
+    """Readiness: 200 once every required component is warm, else 503"""
+    report = readiness()
+    return jsonify(report), 200 if report["ready"] else 503
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
@@ -126,6 +155,7 @@ def index():
                 "version": "1.0.0",
                 "endpoints": {
                     "health": "/health",
+                    "ready": "/ready",
                     "items": {
                         "list": "GET /api/items",
                         "get": "GET /api/items/<id>",
@@ -141,11 +171,39 @@ def index():
                     },
                     "fpl_discount": {
                         "calculate": "POST /fpl-discount",
+                        "batch": "POST /fpl-discount/batch (JSON columns, CSV or JSON lines)",
+                    },
+                    "rank_options": {
+                        "rank": "POST /rank-options",
+                        "probabilistic": 'add "probabilistic": true (+ "samples", "seed")',
+                        "batch": "POST /rank-options/batch",
+                    },
+                    "charity_likelihood": {
+                        "predict": "POST /charity-likelihood",
+                        "batch": "POST /charity-likelihood/batch",
                     },
                     "cpt": {
                         "search": "POST /api/cpt/search",
                         "pricing": "POST /api/cpt/pricing",
+                        "lookup": "POST /api/cpt/lookup",
+                        "lookup_one": "GET /api/cpt/lookup/<code>",
+                        "streaming": 'add "stream": "ndjson" | "sse" to either body',
                     },
+                    "cortex": {
+                        "pool_stats": "GET /api/cortex/stats",
+                    },
+                    "embeddings": {
+                        "stats": "GET /api/embeddings/stats",
+                    },
+                    "llm_cache": {
+                        "stats": "GET /api/llm-cache/stats",
+                    },
+                    "procedure_catalog": {
+                        "status": "GET /api/cpt/catalog",
+                        "refresh": "POST /api/cpt/catalog/refresh",
+                        "router_stats": "GET /api/cpt/router/stats",
+                    },
+                    "startup": "GET /api/startup",
                 },
             }
         ),
@@ -153,11 +211,6 @@ def index():
     )
 
 
-# 2026 Federal Poverty Levels (from healthcare.gov)
-FPL_BASE = 15960
-FPL_PER_EXTRA = 5680
-
-
 def get_fpl(household_size):
     if household_size < 1:
         raise ValueError("Household size must be at least 1")
@@ -168,19 +221,6 @@ def get_fpl_percentage(annual_income, household_size):
     return (annual_income / get_fpl(household_size)) * 100
 
 
-def get_discount(fpl_pct):
-    if fpl_pct <= 100:
-        return 100
-    elif fpl_pct <= 200:
-        return 75
-    elif fpl_pct <= 300:
-        return 50
-    elif fpl_pct <= 400:
-        return 25
-    else:
-        return 0
-
-
 @app.route("/fpl-discount", methods=["POST"])
 def fpl_discount():
     data = request.get_json()
@@ -215,6 +255,35 @@ def fpl_discount():
     )
 
 
+@app.route("/fpl-discount/batch", methods=["POST"])
+def fpl_discount_batch():
+    """
+    /fpl-discount for many households at once, vectorized (see fpl_batch).
+
+    Body: {"incomes": [...], "household_sizes": [...]}, or text/csv /
+    application/x-ndjson rows with income and household_size. Pass
+    ?default_household_size=N for input without a size column. Returns one
+    list per field; rows that /fpl-discount would reject have valid false.
+    """
+    try:
+        default_size = request.args.get("default_household_size", type=int)
+        incomes, household_sizes = parse_households(
+            request.get_data(), request.content_type, default_size
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(incomes) > FPL_BATCH_MAX_ROWS:
+        return (
+            jsonify({"error": f"At most {FPL_BATCH_MAX_ROWS} households per request"}),
+            400,
+        )
+
+    try:
+        return jsonify(to_json_columns(compute_fpl_batch(incomes, household_sizes)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/rank-options", methods=["POST", "OPTIONS"])
 def rank_options():
 
@@ -222,142 +291,117 @@ def rank_options():
         return "", 204
 
     data = request.get_json() or {}
-
     try:
-        oop = float(data.get("estimated_oop", 0))
-    except (TypeError, ValueError):
-        return jsonify({"error": "estimated_oop must be a number"}), 400
-    if oop <= 0:
-        return jsonify({"error": "estimated_oop must be greater than 0"}), 400
+        response = {"ranked_options": rank_scenario(data)}
+        # Optional Monte Carlo outcomes: expected cost, P10/P90, P(cheapest).
+        if data.get("probabilistic"):
+            response.update(
+                simulate_options(data, data.get("samples"), data.get("seed"))
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    try:
-        income_percent_fpl = float(data.get("income_percent_fpl", 0))
-    except (TypeError, ValueError):
-        return jsonify({"error": "income_percent_fpl must be a number"}), 400
-
-    insurance_type = data.get("insurance_type", "PPO")  # PPO, HDHP, Medicaid, Uninsured
-    in_network = bool(data.get("in_network", True))
-    hospital_policy = data.get("hospital_charity_policy", {})
-    if not hospital_policy:
-        return jsonify({"error": "hospital_charity_policy is required"}), 400
-    negotiation_rate = data.get("negotiation_success_rate", 0.2)
-    payment_plan_months = data.get("hospital_payment_plan_months", 12)
-    loan_apr = data.get("loan_apr", 0.15)
-    loan_term = data.get("loan_term_months", 24)
-
-    options = []
-
-    free_care_threshold = hospital_policy.get("free_care_threshold", 100)
-    discount_threshold = hospital_policy.get("discount_threshold", 300)
-    discount_percent = hospital_policy.get("discount_percent", 0)
-
-    # ----------------------------
-    # 1 Charity Care (Income-based)
-    # ----------------------------
-    if income_percent_fpl <= free_care_threshold:
-        options.append(
-            {
-                "name": "Full Charity Care",
-                "total_cost": 0,
-                "monthly_payment": 0,
-                "risk": 0.1,
-            }
-        )
+    return jsonify(response)
 
-    elif income_percent_fpl <= discount_threshold:
-        discounted = oop * (1 - discount_percent)
-        options.append(
-            {
-                "name": "Partial Charity Care",
-                "total_cost": discounted,
-                "monthly_payment": discounted / payment_plan_months,
-                "risk": 0.2,
-            }
-        )
 
-    # ----------------------------
-    # 2 Insurance Appeal (OON scenario)
-    # ----------------------------
-    if not in_network and insurance_type not in ["Medicaid"]:
-        options.append(
-            {
-                "name": "Insurance Appeal for Out-of-Network Coverage",
-                "total_cost": oop * 0.8,
-                "monthly_payment": (oop * 0.8) / 12,
-                "risk": 0.3,
-            }
+@app.route("/rank-options/batch", methods=["POST", "OPTIONS"])
+def rank_options_batch():
+    """
+    /rank-options for many patients: {"scenarios": [<rank-options body>, ...]}.
+    Returns one entry per scenario, in order: {"ranked_options": [...]} or
+    {"error": ...} for a scenario the single endpoint would reject.
+    """
+    if request.method == "OPTIONS":
+        return "", 204
+
+    data = request.get_json(silent=True) or {}
+    scenarios = data.get("scenarios") if isinstance(data, dict) else data
+    if not isinstance(scenarios, list) or not scenarios:
+        return jsonify({"error": "scenarios must be a non-empty list"}), 400
+    if len(scenarios) > RANK_BATCH_MAX_SCENARIOS:
+        return (
+            jsonify({"error": f"At most {RANK_BATCH_MAX_SCENARIOS} scenarios per request"}),
+            400,
         )
 
-    # ----------------------------
-    # 3 Bill Negotiation
-    # ----------------------------
-    negotiated_cost = oop * (1 - negotiation_rate)
-    options.append(
+    try:
+        results = rank_batch(scenarios)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify(
         {
-            "name": "Direct Bill Negotiation",
-            "total_cost": negotiated_cost,
-            "monthly_payment": negotiated_cost / 12,
-            "risk": 0.25,
+            "results": results,
+            "scenarios": len(results),
+            "errors": sum(1 for r in results if "error" in r),
         }
     )
 
-    # ----------------------------
-    # 4 Hospital Payment Plan
-    # ----------------------------
-    options.append(
-        {
-            "name": "Hospital Interest-Free Payment Plan",
-            "total_cost": oop,
-            "monthly_payment": oop / payment_plan_months,
-            "risk": 0.05,
-        }
-    )
 
-    # ----------------------------
-    # 5 HSA/FSA (if HDHP)
-    # ----------------------------
-    if insurance_type == "HDHP" and data.get("hsa_balance", 0) > 0:
-        options.append(
-            {
-                "name": "Use HSA Funds",
-                "total_cost": oop,
-                "monthly_payment": 0,
-                "risk": 0.01,
-            }
+def _charity_model_or_error():
+    model = get_charity_model()
+    if model is None:
+        return None, (
+            jsonify(
+                {"error": "Charity model not trained; run python train_charity_model.py"}
+            ),
+            503,
         )
+    return model, None
 
-    # ----------------------------
-    # 6 Medical Loan (last resort)
-    # ----------------------------
-    total_with_interest = oop * (1 + loan_apr)
-    options.append(
-        {
-            "name": "Medical Loan Financing",
-            "total_cost": total_with_interest,
-            "monthly_payment": total_with_interest / loan_term,
-            "risk": 0.5,
-        }
-    )
 
-    # ----------------------------
-    # Scoring
-    # ----------------------------
-    max_cost = max(o["total_cost"] for o in options)
-    if max_cost == 0:
-        max_cost = 1
-
-    for o in options:
-        normalized_cost = o["total_cost"] / max_cost
-        normalized_monthly = (o["monthly_payment"] / oop) if oop > 0 else 0
-
-        o["score"] = 0.5 * normalized_cost + 0.3 * normalized_monthly + 0.2 * o["risk"]
+@app.route("/charity-likelihood", methods=["POST", "OPTIONS"])
+def charity_likelihood():
+    """P(charity care approval) for one patient (see charity_model)."""
+    if request.method == "OPTIONS":
+        return "", 204
 
-    ranked = sorted(options, key=lambda x: x["score"])
+    model, error = _charity_model_or_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    try:
+        result = predict_patients(model, [data])[0]
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if "error" in result:
+        return jsonify(result), 400
+    return jsonify(result)
+
+
+@app.route("/charity-likelihood/batch", methods=["POST", "OPTIONS"])
+def charity_likelihood_batch():
+    """
+    /charity-likelihood for many patients: {"patients": [<body>, ...]}.
+    Returns one entry per patient, in order, or {"error": ...} for a patient
+    the single endpoint would reject.
+    """
+    if request.method == "OPTIONS":
+        return "", 204
 
-    for r in ranked:
-        r.pop("score")
+    model, error = _charity_model_or_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    patients = data.get("patients") if isinstance(data, dict) else data
+    if not isinstance(patients, list) or not patients:
+        return jsonify({"error": "patients must be a non-empty list"}), 400
+    if len(patients) > CHARITY_BATCH_MAX_PATIENTS:
+        return (
+            jsonify({"error": f"At most {CHARITY_BATCH_MAX_PATIENTS} patients per request"}),
+            400,
+        )
 
-    return jsonify({"ranked_options": ranked[:4]})
+    try:
+        results = predict_patients(model, patients)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify(
+        {
+            "results": results,
+            "patients": len(results),
+            "errors": sum(1 for r in results if "error" in r),
+        }
+    )
 
 
 @app.route("/api/insurance/extract", methods=["POST"])
@@ -397,7 +441,13 @@ def get_extracted_insurance():
     try:
         client = get_client()
 
-        chat_completion = client.chat.completions.create(
+        extracted = cached_completion(
+            "insurance_extract",
+            client,
+            parse=json.loads,
+            # Extracted member details are PHI: short TTL, never on disk.
+            ttl_seconds=INSURANCE_CACHE_TTL_SECONDS,
+            persist=False,
             messages=[
                 {
                     "role": "user",
@@ -421,13 +471,68 @@ def get_extracted_insurance():
             },
             model=MODEL_NAME,
         )
-
-        content = chat_completion.choices[0].message.content
-        return jsonify(json.loads(content)), 200
+        return jsonify(extracted), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _stream_format(stream):
+    """Map the request's "stream" option to a wire format (None = no streaming)."""
+    if stream is True:
+        accept = request.headers.get("Accept", "")
+        return "sse" if "text/event-stream" in accept else "ndjson"
+    return stream if stream in STREAM_FORMATS else None
+
+
+def _stream_response(events, stream_format):
+    """
+    Stream event dicts as NDJSON lines or Server-Sent Events.
+
+    An exception raised while producing events is sent as a final
+    {"event": "error"} record, since the 200 status has already gone out.
+    """
+
+    def encode(event):
+        if stream_format == "sse":
+            return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+
+    def generate():
+        try:
+            for event in events:
+                yield encode(event)
+        except Exception as e:
+            yield encode({"event": "error", "error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream" if stream_format == "sse" else "application/x-ndjson",
+        # Stop proxies (nginx) from buffering the stream into one response.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _pricing_events(reason, cpt_results, pricing_mode, started):
+    """Ranked results first, then one event per cost estimate as it completes."""
+    yield {
+        "event": "results",
+        "reason": reason,
+        "results": cpt_results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    for index, estimate in iter_price_results(cpt_results, pricing_mode):
+        yield {
+            "event": "estimate",
+            "index": index,
+            "cpt_code": cpt_results[index]["cpt_code"],
+            "estimated_cost": estimate,
+        }
+    yield {
+        "event": "done",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
 @app.route("/api/cpt/search", methods=["POST"])
 def cpt_search():
     data = request.get_json(silent=True) or {}
@@ -436,13 +541,38 @@ def cpt_search():
         return jsonify({"error": "Provide a non-empty 'reason' field"}), 400
     top_k = data.get("top_k", 10)
     score_threshold = data.get("score_threshold", 0.5)
+    mode = data.get("mode")
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {list(SEARCH_MODES)}"}), 400
+    backend = data.get("backend")
+    if backend is not None and backend not in SEARCH_BACKENDS:
+        return (
+            jsonify({"error": f"backend must be one of {list(SEARCH_BACKENDS)}"}),
+            400,
+        )
+    stream_format = _stream_format(data.get("stream"))
+    if stream_format is None and data.get("stream"):
+        return (
+            jsonify({"error": f"stream must be true or one of {list(STREAM_FORMATS)}"}),
+            400,
+        )
     try:
-        results = search_cpt_by_reason(
-            reason, top_k=top_k, score_threshold=score_threshold
+        outcome = search_cpt_with_meta(
+            reason,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            mode=mode,
+            backend=backend,
         )
-        return jsonify({"reason": reason, "results": results}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    if stream_format:
+        events = [
+            {"event": "results", "reason": reason, **outcome},
+            {"event": "done", "elapsed_ms": outcome["elapsed_ms"]},
+        ]
+        return _stream_response(events, stream_format)
+    return jsonify({"reason": reason, **outcome}), 200
 
 
 @app.route("/api/cpt/pricing", methods=["POST"])
@@ -453,25 +583,156 @@ def cpt_pricing():
         return jsonify({"error": "Provide a non-empty 'reason' field"}), 400
     top_k = data.get("top_k", 10)
     score_threshold = data.get("score_threshold", 0.5)
+    mode = data.get("mode")
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {list(SEARCH_MODES)}"}), 400
+    backend = data.get("backend")
+    if backend is not None and backend not in SEARCH_BACKENDS:
+        return (
+            jsonify({"error": f"backend must be one of {list(SEARCH_BACKENDS)}"}),
+            400,
+        )
+    stream_format = _stream_format(data.get("stream"))
+    if stream_format is None and data.get("stream"):
+        return (
+            jsonify({"error": f"stream must be true or one of {list(STREAM_FORMATS)}"}),
+            400,
+        )
+    pricing_mode = data.get("pricing_mode", DEFAULT_PRICING_MODE)
+    if pricing_mode not in PRICING_MODES:
+        return (
+            jsonify({"error": f"pricing_mode must be one of {list(PRICING_MODES)}"}),
+            400,
+        )
+    started = time.perf_counter()
     try:
         cpt_results = search_cpt_by_reason(
-            reason, top_k=top_k, score_threshold=score_threshold
+            reason,
+            top_k=top_k,
+            score_threshold=score_threshold,
+            mode=mode,
+            backend=backend,
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    results_with_pricing = []
-    for item in cpt_results:
-        estimate = get_cost_estimate_from_groq(
-            item["cpt_code"],
-            item["procedure_code_description"],
-            item["procedure_code_category"],
-        )
-        results_with_pricing.append({**item, "estimated_cost": estimate})
+    if stream_format:
+        events = _pricing_events(reason, cpt_results, pricing_mode, started)
+        return _stream_response(events, stream_format)
+
+    results_with_pricing = price_results(cpt_results, pricing_mode)
 
     return jsonify({"reason": reason, "results": results_with_pricing}), 200
 
 
+@app.route("/api/cpt/lookup", methods=["POST"])
+def cpt_lookup_batch():
+    """Resolve a list of CPT codes (e.g. from an itemized bill) by exact match"""
+    data = request.get_json(silent=True) or {}
+    codes = data.get("cpt_codes")
+    if not isinstance(codes, list) or not codes:
+        return jsonify({"error": "Provide a non-empty 'cpt_codes' list"}), 400
+    if len(codes) > CPT_LOOKUP_MAX_CODES:
+        return (
+            jsonify({"error": f"At most {CPT_LOOKUP_MAX_CODES} codes per request"}),
+            400,
+        )
+    try:
+        rows = get_cpt_lookup().get_many(codes)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    results = [
+        {**row, "found": True}
+        if row is not None
+        else {"cpt_code": str(code).strip(), "found": False}
+        for code, row in zip(codes, rows)
+    ]
+    not_found = [r["cpt_code"] for r in results if not r["found"]]
+    return jsonify({"results": results, "not_found": not_found}), 200
+
+
+@app.route("/api/cpt/lookup/<code>", methods=["GET"])
+def cpt_lookup_one(code):
+    """Look up a single CPT code by exact match"""
+    try:
+        row = get_cpt_lookup().get(code)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if row is None:
+        return jsonify({"error": "CPT code not found"}), 404
+    return jsonify(row), 200
+
+
+@app.route("/api/cortex/stats", methods=["GET"])
+def cortex_stats():
+    """Connection pool statistics for the shared Cortex client"""
+    return jsonify(pool_stats()), 200
+
+
+@app.route("/api/embeddings/stats", methods=["GET"])
+def embeddings_stats():
+    """Micro-batching metrics for the shared embedding model"""
+    return jsonify(embedding_stats()), 200
+
+
+@app.route("/api/llm-cache/stats", methods=["GET"])
+def llm_cache_stats_view():
+    """Per-call-site hit rates for the shared Groq completion cache"""
+    return jsonify(llm_cache_stats()), 200
+
+
+@app.route("/api/cpt/catalog", methods=["GET"])
+def procedure_catalog_status():
+    """Version and freshness of the cached procedure_index catalog"""
+    return jsonify(get_catalog().stats()), 200
+
+
+@app.route("/api/cpt/catalog/refresh", methods=["POST"])
+def procedure_catalog_refresh():
+    """Reload the procedure_index catalog from Cortex"""
+    try:
+        load_catalog()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify(get_catalog().stats()), 200
+
+
+@app.route("/api/cpt/router/stats", methods=["GET"])
+def category_router_stats():
+    """Share of searches served by the embedding router vs the LLM, with p50/p99"""
+    return jsonify(router_stats()), 200
+
+
+@app.route("/api/startup", methods=["GET"])
+def startup_timings():
+    """Time spent in each startup phase (imports, catalog, model load)"""
+    return jsonify(startup_report()), 200
+
+
+# Load the procedure_index catalog once at startup; searches reload it lazily
+# if Cortex is not reachable yet. Under gunicorn (WARMUP_ON_IMPORT=0) this
+# would open the Cortex channel in the master before fork, so each worker's
+# warm-up loads it instead.
+if WARMUP_ON_IMPORT:
+    with phase("procedure_catalog"):
+        try:
+            load_catalog()
+        except Exception as e:
+            print(f"procedure_index catalog not loaded at startup: {e}")
+
+if EMBED_PRELOAD == "eager":
+    preload_embedding_model()
+elif EMBED_PRELOAD == "background":
+    threading.Thread(
+        target=preload_embedding_model, name="embedding-preload", daemon=True
+    ).start()
+
+if WARMUP_ON_IMPORT:
+    start_warm_up()
+
+mark_ready()
+
+
 # ==================== Entry Point ====================
 
 if __name__ == "__main__":
@@ -480,5 +741,6 @@ if __name__ == "__main__":
 
     # For production, use:
     # app.run(debug=False, host='0.0.0.0', port=5000)
-    # Or better, use a WSGI server like Gunicorn:
-    # gunicorn -w 4 -b 0.0.0.0:5000 app:app
+    # Or better, use a WSGI server like Gunicorn (gunicorn.conf.py preloads
+    # the app and the embedding model so workers share them):
+    # gunicorn -c gunicorn.conf.py app:app
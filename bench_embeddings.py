@@ -0,0 +1,147 @@
+"""
+Compare the torch and int8 ONNX embedding backends (see embedding_service).
+
+Each backend runs in its own spawned process, so resident memory is measured
+without the other model loaded. Reports load time, single-query latency,
+batch throughput over the workbook's CPT descriptions, and memory; then
+checks parity: per-text cosine between the two backends' vectors, and top-10
+overlap when searching the descriptions with a few reasons. Exits non-zero
+when the worst cosine drift exceeds --max-drift.
+
+Usage:
+    python bench_embeddings.py [--trials 50] [--max-drift 0.03]
+"""
+
+from data_cache import CPT_WORKBOOK, load_frame
+from embedding_service import EMBEDDING_BACKENDS, load_model
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+import numpy as np
+
+REASONS = [
+    "knee replacement",
+    "chest pain",
+    "appendicitis",
+    "hip fracture repair",
+    "cataract surgery",
+    "gallbladder removal",
+    "c-section delivery",
+    "coronary artery bypass",
+]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _measure(backend: str, texts: list, trials: int, conn) -> None:
+    rss_start = _rss_mb()
+    started = time.perf_counter()
+    model = load_model(backend)
+    load_s = time.perf_counter() - started
+    model.encode(REASONS)  # first call initialises kernels / thread pools
+
+    latencies = []
+    for i in range(trials):
+        started = time.perf_counter()
+        model.encode(REASONS[i % len(REASONS)])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    doc_vectors = model.encode(texts, batch_size=64, normalize_embeddings=True)
+    batch_s = time.perf_counter() - started
+    query_vectors = model.encode(REASONS, normalize_embeddings=True)
+
+    conn.send(
+        {
+            "backend": backend,
+            "load_s": load_s,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": _percentile(latencies, 95),
+            "rows_per_s": len(texts) / batch_s,
+            "rss_model_mb": _rss_mb() - rss_start,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "doc_vectors": doc_vectors,
+            "query_vectors": query_vectors,
+        }
+    )
+    conn.close()
+
+
+def run_backend(backend: str, texts: list, trials: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_measure, args=(backend, texts, trials, child))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--max-drift",
+        type=float,
+        default=0.03,
+        help="largest allowed 1 - cosine between backends for any text",
+    )
+    args = parser.parse_args()
+
+    texts = (
+        load_frame(CPT_WORKBOOK)["Procedure Code Descriptions"].fillna("").tolist()
+    )
+    results = {b: run_backend(b, texts, args.trials) for b in EMBEDDING_BACKENDS}
+
+    print(
+        f"{'backend':>8} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+        f"{'rows/s':>8} {'model MB':>9} {'peak MB':>8}"
+    )
+    for backend, r in results.items():
+        print(
+            f"{backend:>8} {r['load_s']:7.2f} {r['p50_ms']:7.2f} {r['p95_ms']:7.2f} "
+            f"{r['rows_per_s']:8.0f} {r['rss_model_mb']:9.1f} {r['peak_rss_mb']:8.1f}"
+        )
+
+    torch_r, onnx_r = results["torch"], results["onnx"]
+    cosines = np.concatenate(
+        [
+            (torch_r["doc_vectors"] * onnx_r["doc_vectors"]).sum(axis=1),
+            (torch_r["query_vectors"] * onnx_r["query_vectors"]).sum(axis=1),
+        ]
+    )
+    drift = 1 - cosines
+    overlaps = []
+    for i in range(len(REASONS)):
+        tops = [
+            set(np.argsort(-(r["doc_vectors"] @ r["query_vectors"][i]))[: args.top_k])
+            for r in (torch_r, onnx_r)
+        ]
+        overlaps.append(len(tops[0] & tops[1]) / args.top_k)
+    print(
+        f"\nparity: mean drift {drift.mean():.5f}, max drift {drift.max():.5f} "
+        f"over {len(drift)} texts; top-{args.top_k} overlap "
+        f"{statistics.mean(overlaps):.0%} (min {min(overlaps):.0%})"
+    )
+    if drift.max() > args.max_drift:
+        print(f"✗ max drift exceeds {args.max_drift}")
+        sys.exit(1)
+    print(f"✓ max drift within {args.max_drift}")
+
+
+if __name__ == "__main__":
+    main()
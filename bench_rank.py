@@ -0,0 +1,119 @@
+"""
+Throughput and parity of the /rank-options scoring paths (see rank_engine).
+
+Generates a seeded caseload of scenarios from the patient CSV incomes and
+compares three paths:
+  - single:  one POST /rank-options per patient (Flask test client)
+  - scalar:  rank_scenario in a loop, no HTTP
+  - batch:   one POST /rank-options/batch, and rank_batch on its own
+Every batch result must equal the single-request response exactly; exits
+non-zero on any mismatch.
+
+Usage:
+    python bench_rank.py [--scenarios 5000] [--seed 0]
+"""
+
+from data_cache import PATIENTS_CSV, load_columns
+from fpl_batch import compute_fpl_batch
+from rank_engine import rank_batch, rank_scenario
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+INSURANCE_TYPES = ["PPO", "HDHP", "Medicaid", "Uninsured"]
+
+
+def make_scenarios(n: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    incomes = np.asarray(load_columns(PATIENTS_CSV, columns=["INCOME"])["INCOME"])
+    incomes = rng.choice(incomes, n) * rng.uniform(0.05, 1.0, n)
+    sizes = rng.integers(1, 7, n)
+    fpl_pct = compute_fpl_batch(incomes, sizes)["fpl_percentage"]
+    scenarios = []
+    for i in range(n):
+        scenario = {
+            "estimated_oop": round(float(rng.uniform(200, 60000)), 2),
+            "income_percent_fpl": float(fpl_pct[i]),
+            "insurance_type": INSURANCE_TYPES[rng.integers(len(INSURANCE_TYPES))],
+            "in_network": bool(rng.random() < 0.8),
+            "hospital_charity_policy": {
+                "free_care_threshold": int(rng.choice([100, 150, 200])),
+                "discount_threshold": int(rng.choice([250, 300, 400])),
+                "discount_percent": float(rng.choice([0.25, 0.5, 0.75])),
+            },
+            "hsa_balance": int(rng.choice([0, 500, 3000])),
+        }
+        # Exercise the defaults as well as explicit values.
+        if rng.random() < 0.5:
+            scenario["negotiation_success_rate"] = round(float(rng.uniform(0, 0.5)), 2)
+            scenario["hospital_payment_plan_months"] = int(rng.choice([6, 12, 24, 36]))
+            scenario["loan_apr"] = round(float(rng.uniform(0.05, 0.3)), 3)
+            scenario["loan_term_months"] = int(rng.choice([12, 24, 48]))
+        scenarios.append(scenario)
+    # A few the endpoint rejects, to check errors line up too.
+    scenarios[::997] = [{"estimated_oop": 0, "hospital_charity_policy": {"x": 1}}] * len(
+        scenarios[::997]
+    )
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app import app
+
+    client = app.test_client()
+    scenarios = make_scenarios(args.scenarios, args.seed)
+    n = len(scenarios)
+
+    started = time.perf_counter()
+    single = [client.post("/rank-options", json=s).get_json() for s in scenarios]
+    single_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for s in scenarios:
+        try:
+            rank_scenario(s)
+        except ValueError:
+            pass
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    response = client.post("/rank-options/batch", json={"scenarios": scenarios})
+    batch_http_s = time.perf_counter() - started
+    batch = response.get_json()["results"]
+
+    started = time.perf_counter()
+    rank_batch(scenarios)
+    batch_s = time.perf_counter() - started
+
+    print(f"{n} scenarios")
+    for label, seconds in [
+        ("single HTTP", single_s),
+        ("scalar loop", scalar_s),
+        ("batch HTTP", batch_http_s),
+        ("batch engine", batch_s),
+    ]:
+        print(f"{label:>13}: {seconds * 1000:9.1f} ms  {n / seconds:10.0f} scenarios/s")
+
+    # Compare serialized JSON so 0 vs 0.0 and float bits both count.
+    mismatches = [
+        i
+        for i, (a, b) in enumerate(zip(single, batch))
+        if json.dumps(a, sort_keys=True) != json.dumps(b, sort_keys=True)
+    ]
+    if mismatches:
+        i = mismatches[0]
+        print(f"✗ {len(mismatches)} mismatches; first at {i}:")
+        print(f"  single: {single[i]}\n  batch:  {batch[i]}")
+        sys.exit(1)
+    print(f"✓ batch matches /rank-options for all {n} scenarios")
+
+
+if __name__ == "__main__":
+    main()
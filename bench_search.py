@@ -0,0 +1,81 @@
+"""
+Benchmark the two CPT retrieval modes ("fanout" vs "overfetch") against Cortex.
+
+The LLM stage is skipped: each trial searches a fixed reason against a random
+set of procedure categories drawn from the cached procedure_index, so the
+numbers isolate the retrieval round trips.
+
+Usage:
+    python bench_search.py [--trials 20] [--top-k 10] [--categories 1 3 5 10]
+"""
+
+from cortex_pool import pool_stats, run
+from cpt_search import SEARCH_MODES, retrieve
+from embedding_service import encode
+from procedure_catalog import get_catalog
+import argparse
+import random
+import statistics
+import time
+
+REASONS = [
+    "knee replacement",
+    "chest pain",
+    "appendicitis",
+    "hip fracture repair",
+    "cataract surgery",
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--categories", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    all_categories = sorted(
+        {e["procedure_code_category"] for e in run(get_catalog().get_entries())}
+    )
+    vectors = {r: encode(r).tolist() for r in REASONS}
+
+    # Warm up the pool so connection setup is not part of the measurement.
+    for mode in SEARCH_MODES:
+        run(retrieve(vectors[REASONS[0]], args.top_k, all_categories[:1], mode))
+
+    print(f"{'categories':>10} {'mode':>10} {'p50 ms':>9} {'p95 ms':>9} {'overlap':>8}")
+    for n in args.categories:
+        n = min(n, len(all_categories))
+        timings = {mode: [] for mode in SEARCH_MODES}
+        overlaps = []
+        for _ in range(args.trials):
+            reason = rng.choice(REASONS)
+            cats = rng.sample(all_categories, n)
+            codes = {}
+            for mode in SEARCH_MODES:
+                started = time.perf_counter()
+                hits = run(retrieve(vectors[reason], args.top_k, cats, mode))
+                timings[mode].append((time.perf_counter() - started) * 1000)
+                codes[mode] = {h["cpt_code"] for h in hits}
+            union = set().union(*codes.values())
+            overlaps.append(
+                len(set.intersection(*codes.values())) / len(union) if union else 1.0
+            )
+        for mode in SEARCH_MODES:
+            print(
+                f"{n:>10} {mode:>10} {statistics.median(timings[mode]):>9.2f} "
+                f"{_percentile(timings[mode], 95):>9.2f} {statistics.mean(overlaps):>8.2f}"
+            )
+
+    print(f"\nPool: {pool_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Offline job: price every CPT code in the workbook once and write the
+precomputed pricing table served by pricing_table.py.
+
+Progress is appended to a JSONL checkpoint as each chunk completes, so an
+interrupted run resumes where it stopped. Codes that fail are left out of the
+checkpoint and retried on the next run.
+
+Usage:
+    python build_pricing_table.py [--workers 4] [--chunk-size 10] [--mode batch]
+"""
+
+from pricing import GROQ_MODEL, PRICING_MODES, get_cost_estimates_batch, price_one
+from pricing_table import PRICING_TABLE_DIR, write_table
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from data_cache import CPT_WORKBOOK, load_frame
+import argparse
+import hashlib
+import json
+import os
+import time
+
+# Bump when the pricing prompts change so old checkpoints are not reused.
+PROMPT_VERSION = "1"
+
+
+def table_version(workbook: str) -> str:
+    digest = hashlib.sha256()
+    with open(workbook, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"{GROQ_MODEL}:{PROMPT_VERSION}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_codes(workbook: str) -> list:
+    df = load_frame(workbook)
+    df["Procedure Code Descriptions"] = df["Procedure Code Descriptions"].fillna("")
+    df["CPT Codes"] = df["CPT Codes"].astype(str)
+    codes = zip(
+        df["CPT Codes"], df["Procedure Code Descriptions"], df["Procedure Code Category"]
+    )
+    # One row per code; the workbook is the source of truth for descriptions.
+    return list({code: (code, desc, cat) for code, desc, cat in codes}.values())
+
+
+def load_checkpoint(path: str, version: str) -> dict:
+    """Rows already priced for this table version, keyed by CPT code."""
+    done = {}
+    try:
+        with open(path) as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("version") != version:
+                print(f"Checkpoint is for {header.get('version')}; starting over")
+                return {}
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # line torn by a crash; that code is re-priced
+                done[row["cpt_code"]] = row
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def price_chunk(chunk: list, mode: str) -> list:
+    # Always price live: the existing table may be from an older version.
+    if mode == "batch":
+        estimates = get_cost_estimates_batch(chunk, use_table=False)
+    else:
+        estimates = [price_one(item, use_table=False) for item in chunk]
+    return [
+        {"cpt_code": code, **estimate}
+        for (code, _, _), estimate in zip(chunk, estimates)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the CPT pricing table")
+    parser.add_argument("--workbook", default=CPT_WORKBOOK)
+    parser.add_argument("--output", default=PRICING_TABLE_DIR)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument("--mode", choices=PRICING_MODES, default="batch")
+    parser.add_argument("--fresh", action="store_true", help="ignore any checkpoint")
+    args = parser.parse_args()
+
+    version = table_version(args.workbook)
+    checkpoint_path = f"{args.output.rstrip(os.sep)}.checkpoint.jsonl"
+    done = {} if args.fresh else load_checkpoint(checkpoint_path, version)
+
+    codes = load_codes(args.workbook)
+    todo = [item for item in codes if item[0] not in done]
+    print(f"Table version {version}: {len(codes)} codes, {len(done)} already priced")
+
+    if not done:
+        with open(checkpoint_path, "w") as f:
+            f.write(json.dumps({"version": version}) + "\n")
+
+    size = args.chunk_size
+    chunks = [todo[i : i + size] for i in range(0, len(todo), size)]
+    failed = 0
+    started = time.perf_counter()
+    with open(checkpoint_path, "a") as checkpoint, ThreadPoolExecutor(
+        max_workers=args.workers
+    ) as executor:
+        futures = [executor.submit(price_chunk, chunk, args.mode) for chunk in chunks]
+        for future in as_completed(futures):
+            for row in future.result():
+                if "error" in row:
+                    failed += 1
+                    continue
+                done[row["cpt_code"]] = row
+                checkpoint.write(json.dumps(row) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            elapsed = time.perf_counter() - started
+            print(f"  {len(done)}/{len(codes)} priced ({elapsed:.1f}s)", flush=True)
+
+    valid = {code for code, _, _ in codes}
+    rows = [row for code, row in done.items() if code in valid]
+    write_table(rows, version, args.output)
+    print(f"✓ Wrote {len(rows)} rows to '{args.output}' (version {version})")
+    if failed:
+        print(f"✗ {failed} codes failed; re-run to retry them (live pricing covers them)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Embedding-based procedure category router.
+
+Embeds each procedure_index entry once and scores the query embedding against
+them. Categories within CPT_ROUTER_MARGIN of the best match are selected; when
+the best match is below CPT_ROUTER_MIN_SCORE the router is not confident and
+the caller falls back to the Groq LLM selection.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, List
+import os
+import threading
+import numpy as np
+
+ROUTER_ENABLED = os.environ.get("CPT_ROUTER_ENABLED", "1") == "1"
+ROUTER_MIN_SCORE = float(os.environ.get("CPT_ROUTER_MIN_SCORE", "0.45"))
+ROUTER_MARGIN = float(os.environ.get("CPT_ROUTER_MARGIN", "0.08"))
+ROUTER_MAX_CATEGORIES = int(os.environ.get("CPT_ROUTER_MAX_CATEGORIES", "5"))
+# Latency samples kept per path for the p50/p99 report.
+LATENCY_WINDOW = 1000
+
+
+@dataclass
+class RouteDecision:
+    categories: List[str]
+    confidence: float
+    confident: bool
+    scores: dict = field(default_factory=dict)
+
+
+def _entry_text(entry: dict) -> str:
+    parts = [
+        entry.get("procedure_code_category"),
+        entry.get("operative_procedure"),
+        entry.get("procedure_description"),
+    ]
+    return ": ".join(str(p) for p in parts if p)
+
+
+class CategoryRouter:
+    def __init__(self, entries: List[dict], encode: Callable):
+        self.categories = [e.get("procedure_code_category") for e in entries]
+        texts = [_entry_text(e) for e in entries]
+        vectors = np.asarray(encode(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1, norms)
+
+    def route(self, query_vector) -> RouteDecision:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        sims = self.vectors @ query
+
+        # Several index rows can share a category; keep each category's best row.
+        best: dict = {}
+        for cat, sim in zip(self.categories, sims.tolist()):
+            if cat and sim > best.get(cat, -1.0):
+                best[cat] = sim
+        if not best:
+            return RouteDecision([], 0.0, False)
+
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        top_score = ranked[0][1]
+        selected = [
+            cat
+            for cat, sim in ranked[:ROUTER_MAX_CATEGORIES]
+            if sim >= top_score - ROUTER_MARGIN
+        ]
+        return RouteDecision(
+            categories=selected,
+            confidence=round(top_score, 4),
+            confident=top_score >= ROUTER_MIN_SCORE,
+            scores={cat: round(sim, 4) for cat, sim in ranked[:ROUTER_MAX_CATEGORIES]},
+        )
+
+
+_lock = threading.Lock()
+_router: CategoryRouter | None = None
+_router_entries = None
+
+
+def get_router(entries: List[dict], encode: Callable) -> CategoryRouter:
+    """Return a router for `entries`, rebuilding it when the catalog reloads."""
+    global _router, _router_entries
+    with _lock:
+        if _router is None or _router_entries is not entries:
+            _router = CategoryRouter(entries, encode)
+            _router_entries = entries
+        return _router
+
+
+# -----------------------------
+# Per-path latency report
+# -----------------------------
+_latencies = {path: deque(maxlen=LATENCY_WINDOW) for path in ("router", "llm")}
+_counts = {"router": 0, "llm": 0}
+
+
+def record(path: str, seconds: float) -> None:
+    with _lock:
+        _counts[path] += 1
+        _latencies[path].append(seconds)
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def router_stats() -> dict:
+    with _lock:
+        snapshot = {path: list(samples) for path, samples in _latencies.items()}
+        counts = dict(_counts)
+    total = sum(counts.values())
+    return {
+        "enabled": ROUTER_ENABLED,
+        "min_score": ROUTER_MIN_SCORE,
+        "margin": ROUTER_MARGIN,
+        "router_share": round(counts["router"] / total, 4) if total else None,
+        "paths": {
+            path: {
+                "requests": counts[path],
+                "p50_ms": round(_percentile(samples, 50) * 1000, 2) if samples else None,
+                "p99_ms": round(_percentile(samples, 99) * 1000, 2) if samples else None,
+            }
+            for path, samples in snapshot.items()
+        },
+    }
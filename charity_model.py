@@ -0,0 +1,265 @@
+"""
+Charity-care approval likelihood (see ML_Model_Blueprint.md).
+
+train_charity_model.py fits a scikit-learn gradient-boosted tree model on
+synthetic labels and compiles it into CHARITY_MODEL_PATH, an .npz of
+fixed-size node arrays (feature, threshold, left, right, value per tree),
+plus the Platt-scaling coefficients. Serving only needs NumPy. A batch of
+rows walks every tree at once, one vectorized step per tree level, so a
+prediction costs a few array gathers and never imports scikit-learn.
+
+`build_features` is shared by training and serving, so both see identical
+feature vectors. The model is trained on synthetic labels informed by
+federal 501(r) thresholds and stochastic approval behavior modeling; no
+real approval outcomes are involved.
+"""
+
+from fpl_batch import compute_fpl_batch
+from typing import Dict, List, Optional
+import json
+import math
+import os
+import threading
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+CHARITY_MODEL_PATH = os.environ.get(
+    "CHARITY_MODEL_PATH", os.path.join(_HERE, "charity_model.npz")
+)
+CHARITY_BATCH_MAX_PATIENTS = int(os.environ.get("CHARITY_BATCH_MAX_PATIENTS", "10000"))
+
+FEATURE_NAMES = [
+    "fpl_percentage",
+    "income_gap_free",
+    "income_gap_discount",
+    "family_size",
+    "age",
+    "uninsured",
+    "medicaid",
+    "diagnosis_severity",
+    "hospital_fpl_free",
+    "hospital_fpl_discount",
+    "urban",
+]
+# Defaults for optional request fields.
+DEFAULT_AGE = 40
+DEFAULT_SEVERITY = 0.5
+DEFAULT_FREE_THRESHOLD = 100
+DEFAULT_DISCOUNT_THRESHOLD = 300
+
+
+def confidence_label(probability: float) -> str:
+    if probability >= 0.7:
+        return "High"
+    if probability >= 0.4:
+        return "Medium"
+    return "Low"
+
+
+def build_features(c: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    (n, len(FEATURE_NAMES)) matrix from per-patient arrays: income,
+    family_size, age, uninsured, medicaid, diagnosis_severity (0-1),
+    hospital_fpl_free, hospital_fpl_discount, urban.
+    """
+    fpl = compute_fpl_batch(c["income"], c["family_size"])
+    fpl_pct = fpl["fpl_percentage"]
+    free = np.asarray(c["hospital_fpl_free"], dtype=np.float64)
+    discount = np.asarray(c["hospital_fpl_discount"], dtype=np.float64)
+    columns = {
+        "fpl_percentage": fpl_pct,
+        "income_gap_free": fpl_pct - free,
+        "income_gap_discount": fpl_pct - discount,
+        "family_size": c["family_size"],
+        "age": c["age"],
+        "uninsured": c["uninsured"],
+        "medicaid": c["medicaid"],
+        "diagnosis_severity": c["diagnosis_severity"],
+        "hospital_fpl_free": free,
+        "hospital_fpl_discount": discount,
+        "urban": c["urban"],
+    }
+    return np.column_stack(
+        [np.asarray(columns[name], dtype=np.float64) for name in FEATURE_NAMES]
+    )
+
+
+def _number(data: dict, key: str, default=None) -> float:
+    value = data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{key} must be a number")
+    if not math.isfinite(value):
+        raise ValueError(f"{key} must be a finite number")
+    return float(value)
+
+
+def parse_patient(data: dict) -> dict:
+    """Validated inputs of one /charity-likelihood body; ValueError -> 400."""
+    if not isinstance(data, dict):
+        raise ValueError("each patient must be an object")
+    income = _number(data, "income")
+    family_size = data.get("family_size", data.get("household_size"))
+    if isinstance(family_size, bool) or not isinstance(family_size, int):
+        raise ValueError("family_size must be an integer")
+    if family_size < 1:
+        raise ValueError("family_size must be at least 1")
+    if income < 0:
+        raise ValueError("income cannot be negative")
+
+    policy = data.get("hospital_charity_policy") or {}
+    if not isinstance(policy, dict):
+        raise ValueError("hospital_charity_policy must be an object")
+    severity = _number(data, "diagnosis_severity", DEFAULT_SEVERITY)
+    if not 0 <= severity <= 1:
+        raise ValueError("diagnosis_severity must be between 0 and 1")
+    insurance_type = data.get("insurance_type", "PPO")
+    return {
+        "income": income,
+        "family_size": family_size,
+        "age": _number(data, "age", DEFAULT_AGE),
+        "uninsured": insurance_type == "Uninsured",
+        "medicaid": insurance_type == "Medicaid",
+        "diagnosis_severity": severity,
+        "hospital_fpl_free": _number(
+            policy, "free_care_threshold", DEFAULT_FREE_THRESHOLD
+        ),
+        "hospital_fpl_discount": _number(
+            policy, "discount_threshold", DEFAULT_DISCOUNT_THRESHOLD
+        ),
+        "urban": bool(data.get("urban", True)),
+    }
+
+
+class CharityModel:
+    """A compiled boosted-tree classifier loaded from an .npz file."""
+
+    def __init__(self, arrays: dict, source: str = ""):
+        self.feature = np.asarray(arrays["feature"])  # (trees, nodes), -1 at leaves
+        self.threshold = np.asarray(arrays["threshold"])
+        self.left = np.asarray(arrays["left"])
+        self.right = np.asarray(arrays["right"])
+        self.value = np.asarray(arrays["value"])  # learning rate already applied
+        self.bias = float(arrays["bias"])
+        self.platt = np.asarray(arrays["platt"])  # p = sigmoid(a * raw + b)
+        self.depth = int(arrays["depth"])
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+        self.metadata = json.loads(str(arrays.get("metadata", "{}")))
+        if self.feature_names != FEATURE_NAMES:
+            raise ValueError(
+                f"{source} was trained on {self.feature_names}, expected {FEATURE_NAMES}"
+            )
+        self.source = source
+        self._trees = np.arange(len(self.feature))
+
+    @classmethod
+    def load(cls, path: str) -> "CharityModel":
+        with np.load(path) as npz:
+            return cls({key: npz[key] for key in npz.files}, source=path)
+
+    def __len__(self) -> int:
+        return len(self.feature)
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        """(n, trees) leaf index reached by every row in every tree."""
+        # scikit-learn trees compare float32 features against their thresholds.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.zeros((len(X), len(self._trees)), dtype=np.int32)
+        for _ in range(self.depth):
+            feature = self.feature[self._trees, node]
+            leaf = feature < 0
+            x = X[rows, np.maximum(feature, 0)]
+            step = np.where(
+                x <= self.threshold[self._trees, node],
+                self.left[self._trees, node],
+                self.right[self._trees, node],
+            )
+            node = np.where(leaf, node, step)
+        return node
+
+    def raw(self, X: np.ndarray) -> np.ndarray:
+        """Uncalibrated log-odds, as the boosted model's decision_function."""
+        return self.value[self._trees, self._leaves(X)].sum(axis=1) + self.bias
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Calibrated P(approval) per row."""
+        a, b = self.platt
+        return 1 / (1 + np.exp(-(a * self.raw(X) + b)))
+
+
+_lock = threading.Lock()
+_model: Optional[CharityModel] = None
+_model_mtime: Optional[float] = None
+
+
+def get_charity_model() -> Optional[CharityModel]:
+    """The shared model, reloaded when the file changes; None if not trained."""
+    global _model, _model_mtime
+    try:
+        mtime = os.stat(CHARITY_MODEL_PATH).st_mtime
+    except OSError:
+        return None
+    if _model is None or mtime != _model_mtime:
+        with _lock:
+            if _model is None or mtime != _model_mtime:
+                _model = CharityModel.load(CHARITY_MODEL_PATH)
+                _model_mtime = mtime
+    return _model
+
+
+def predict_patients(model: CharityModel, patients: List[dict]) -> List[dict]:
+    """
+    One {"approval_probability", "confidence"} per patient, or {"error": ...}
+    for a patient that fails validation.
+    """
+    results: List[dict] = [{} for _ in patients]
+    parsed, rows = [], []
+    for i, data in enumerate(patients):
+        try:
+            parsed.append(parse_patient(data))
+            rows.append(i)
+        except ValueError as e:
+            results[i] = {"error": str(e)}
+    if parsed:
+        columns = {key: np.array([p[key] for p in parsed]) for key in parsed[0]}
+        probabilities = model.predict_proba(build_features(columns)).tolist()
+        for i, probability in zip(rows, probabilities):
+            results[i] = {
+                "approval_probability": round(probability, 4),
+                "confidence": confidence_label(probability),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    # Per-patient latency of the compiled model, single rows and a batch.
+    import time
+
+    model = get_charity_model()
+    if model is None:
+        raise SystemExit(f"{CHARITY_MODEL_PATH} not found; run train_charity_model.py")
+    rng = np.random.default_rng(0)
+    patients = [
+        {
+            "income": float(rng.uniform(5000, 150000)),
+            "family_size": int(rng.integers(1, 7)),
+            "insurance_type": str(rng.choice(["PPO", "Medicaid", "Uninsured"])),
+        }
+        for _ in range(2000)
+    ]
+    predict_patients(model, patients[:1])
+    latencies = []
+    for patient in patients:
+        started = time.perf_counter()
+        predict_patients(model, [patient])
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    started = time.perf_counter()
+    predict_patients(model, patients)
+    batch_ms = (time.perf_counter() - started) * 1000
+    print(
+        f"{len(model)} trees, depth {model.depth}: single p50 "
+        f"{latencies[len(latencies) // 2]:.3f} ms, p99 "
+        f"{latencies[int(len(latencies) * 0.99)]:.3f} ms; batch of {len(patients)} "
+        f"{batch_ms:.1f} ms ({batch_ms * 1000 / len(patients):.1f} µs/patient)"
+    )
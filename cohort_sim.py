@@ -0,0 +1,352 @@
+"""
+Cohort simulation: FPL discounts and option rankings over a patient CSV.
+
+Runs the same logic as /fpl-discount and /rank-options (fpl_batch and
+rank_engine) over every patient in a Synthea-style CSV and writes aggregated
+outcome distributions by state, county and FPL band.
+
+The CSV is split into byte ranges aligned to line starts. Each worker process
+parses only its own range with pandas, derives household-level inputs, and
+aggregates them to (state, county, FPL band) sums and counts. Nothing
+per-patient leaves the worker, and the parent only adds up small tables, so
+throughput grows with --workers. Byte-range splitting assumes no quoted
+newlines, which holds for Synthea exports.
+
+Household inputs are derived from the columns Synthea provides:
+  - household_size: 1, plus 1 if MARITAL is "M", plus 0-3 dependents taken
+    from a hash of Id (stable across runs and chunk sizes)
+  - estimated_oop: HEALTHCARE_EXPENSES (what the patient paid over their
+    life) / age in years, i.e. a yearly out-of-pocket amount
+  - insurance_type: Uninsured if HEALTHCARE_COVERAGE is 0, else Medicaid
+    at or below COHORT_MEDICAID_FPL, else HDHP when the patient paid more
+    than half of their care, else PPO. HDHP patients are assumed to have HSA
+    funds.
+  - in_network: False for a hashed --oon-rate share of patients
+
+Output goes to --out (one directory per table, in the data_cache column
+format; read back with data_cache.read_frame), plus summary.json.
+
+Usage:
+    python cohort_sim.py [--csv patients.csv] [--workers 8] [--chunk-mb 8]
+    python cohort_sim.py --scaling        # time 1, 2, 4 ... --workers
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from data_cache import PATIENTS_CSV, file_hash, read_frame, write_columns
+from fpl_batch import FPL_DISCOUNT_BREAKPOINTS, compute_fpl_batch
+from rank_engine import KIND_NAMES, rank_columns
+from typing import Dict, List, Tuple
+import argparse
+import io
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+COHORT_OUT_DIR = os.environ.get("COHORT_OUT_DIR", os.path.join(_HERE, "cohort_results"))
+# Age is measured up to DEATHDATE, or this date for living patients.
+COHORT_REFERENCE_DATE = os.environ.get("COHORT_REFERENCE_DATE", "2026-01-01")
+COHORT_MEDICAID_FPL = float(os.environ.get("COHORT_MEDICAID_FPL", "138"))
+
+USECOLS = [
+    "Id",
+    "BIRTHDATE",
+    "DEATHDATE",
+    "MARITAL",
+    "STATE",
+    "COUNTY",
+    "INCOME",
+    "HEALTHCARE_EXPENSES",
+    "HEALTHCARE_COVERAGE",
+]
+GROUP_KEYS = ["state", "county", "fpl_band"]
+# Upper edges of the recommended-option cost histogram; the last bin is open.
+COST_BINS = [0, 500, 1000, 2500, 5000, 10000, 25000]
+FPL_BANDS = (
+    [f"<={FPL_DISCOUNT_BREAKPOINTS[0]:g}%"]
+    + [
+        f"{lo:g}-{hi:g}%"
+        for lo, hi in zip(FPL_DISCOUNT_BREAKPOINTS[:-1], FPL_DISCOUNT_BREAKPOINTS[1:])
+    ]
+    + [f">{FPL_DISCOUNT_BREAKPOINTS[-1]:g}%"]
+)
+# Rollups written next to the full-grain table.
+TABLES = {
+    "by_state": ["state"],
+    "by_county": ["state", "county"],
+    "by_fpl_band": ["fpl_band"],
+    "by_state_county_fpl_band": GROUP_KEYS,
+}
+
+
+def _slug(name: str) -> str:
+    return "".join(ch if ch.isalnum() else "_" for ch in name.lower()).strip("_")
+
+
+TOP_OPTION_COLUMNS = [f"top_{_slug(name)}" for name in KIND_NAMES]
+COST_BIN_COLUMNS = [f"cost_le_{edge}" for edge in COST_BINS] + [
+    f"cost_gt_{COST_BINS[-1]}"
+]
+
+
+def byte_ranges(path: str, chunk_bytes: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """Header columns and (start, end) offsets of chunks that end on a newline."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline().decode().strip().split(",")
+        ranges = []
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # finish the line the cut landed in
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def household_inputs(df: pd.DataFrame, settings: dict) -> Dict[str, np.ndarray]:
+    """Per-patient /fpl-discount and /rank-options inputs (see module docstring)."""
+    id_hash = pd.util.hash_pandas_object(df["Id"], index=False).to_numpy()
+    dependents = (id_hash % 4).astype(np.int64)
+    household_size = 1 + (df["MARITAL"] == "M").to_numpy().astype(np.int64) + dependents
+
+    born = pd.to_datetime(df["BIRTHDATE"], errors="coerce")
+    until = pd.to_datetime(df["DEATHDATE"], errors="coerce").fillna(
+        pd.Timestamp(settings["reference_date"])
+    )
+    age_years = np.maximum(((until - born).dt.days / 365.25).to_numpy(np.float64), 1.0)
+
+    expenses = df["HEALTHCARE_EXPENSES"].to_numpy(np.float64)
+    coverage = df["HEALTHCARE_COVERAGE"].to_numpy(np.float64)
+    return {
+        "income": df["INCOME"].to_numpy(np.float64),
+        "household_size": household_size,
+        "age": age_years,
+        "estimated_oop": expenses / age_years,
+        "uninsured": coverage <= 0,
+        "patient_share": expenses / np.maximum(expenses + coverage, 1.0),
+        # Different hash bits from the dependents count.
+        "in_network": ((id_hash >> 8) % 10000) / 10000 >= settings["oon_rate"],
+    }
+
+
+def simulate_frame(df: pd.DataFrame, settings: dict) -> pd.DataFrame:
+    """Aggregate outcomes of one chunk, one row per (state, county, FPL band)."""
+    h = household_inputs(df, settings)
+    fpl = compute_fpl_batch(h["income"], h["household_size"])
+    fpl_pct = fpl["fpl_percentage"]
+
+    medicaid = ~h["uninsured"] & (fpl_pct <= settings["medicaid_fpl"])
+    hdhp = ~h["uninsured"] & ~medicaid & (h["patient_share"] > 0.5)
+    n = len(df)
+    ranked = rank_columns(
+        {
+            "oop": h["estimated_oop"],
+            "income_percent_fpl": fpl_pct,
+            "medicaid": medicaid,
+            "in_network": h["in_network"],
+            "free_care_threshold": np.full(n, settings["free_care_threshold"]),
+            "discount_threshold": np.full(n, settings["discount_threshold"]),
+            "discount_percent": np.full(n, settings["discount_percent"]),
+            "negotiation_rate": np.full(n, settings["negotiation_rate"]),
+            "payment_plan_months": np.full(n, settings["payment_plan_months"]),
+            "loan_apr": np.full(n, settings["loan_apr"]),
+            "loan_term": np.full(n, settings["loan_term"]),
+            "has_hsa": hdhp,
+        }
+    )
+    top_kind = ranked["kind"][:, 0]
+    top_cost = ranked["total_cost"][:, 0]
+
+    # Patients the endpoints would reject (no income, zero expenses, ...).
+    valid = fpl["valid"] & (h["estimated_oop"] > 0) & np.isfinite(top_cost)
+    band = np.searchsorted(FPL_DISCOUNT_BREAKPOINTS, fpl_pct, side="left")
+
+    bands = np.asarray(FPL_BANDS, dtype=object)
+    out = pd.DataFrame(
+        {
+            "state": df["STATE"].fillna("").to_numpy(str),
+            "county": df["COUNTY"].fillna("").to_numpy(str),
+            "fpl_band": bands[np.minimum(band, len(FPL_BANDS) - 1)],
+            "patients": 1,
+            "income_sum": h["income"],
+            "household_size_sum": h["household_size"],
+            "oop_sum": h["estimated_oop"],
+            "deduction_sum": fpl["estimated_deduction_amount"],
+            "top_cost_sum": top_cost,
+            "free_care": fpl_pct <= settings["free_care_threshold"],
+            "medicaid": medicaid,
+            "uninsured": h["uninsured"],
+        }
+    )[valid]
+    for kind, column in enumerate(TOP_OPTION_COLUMNS):
+        out[column] = top_kind[valid] == kind
+    cost_bin = np.searchsorted(COST_BINS, top_cost[valid], side="left")
+    for i, column in enumerate(COST_BIN_COLUMNS):
+        out[column] = cost_bin == i
+
+    aggregated = out.groupby(GROUP_KEYS, sort=False).sum(numeric_only=True)
+    aggregated["skipped"] = 0
+    if (~valid).any():
+        # Keep the count of rejected rows so totals reconcile with the input.
+        skipped = pd.DataFrame(
+            {key: [""] for key in GROUP_KEYS} | {"skipped": [int((~valid).sum())]}
+        ).set_index(GROUP_KEYS)
+        aggregated = pd.concat([aggregated, skipped]).fillna(0)
+    return aggregated
+
+
+def simulate_range(
+    path: str, header: List[str], start: int, end: int, settings: dict
+) -> pd.DataFrame:
+    """Worker entry point: parse bytes [start, end) of `path` and aggregate."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=header, usecols=USECOLS)
+    return simulate_frame(df, settings)
+
+
+def _merge(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(parts).groupby(level=GROUP_KEYS, sort=False).sum()
+
+
+def run(
+    path: str, settings: dict, workers: int, chunk_bytes: int
+) -> Tuple[pd.DataFrame, dict]:
+    """Fine-grain aggregate over the whole file, plus run stats."""
+    started = time.perf_counter()
+    header, ranges = byte_ranges(path, chunk_bytes)
+    missing = [c for c in USECOLS if c not in header]
+    if missing:
+        raise ValueError(f"{path} is missing columns {missing}")
+    if not ranges:
+        raise ValueError(f"{path} has no patient rows")
+
+    total = None
+    pending = set()
+    todo = iter(ranges)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # At most two chunks per worker in flight keeps memory flat for
+        # arbitrarily large inputs.
+        for start, end in todo:
+            pending.add(pool.submit(simulate_range, path, header, start, end, settings))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                parts = [f.result() for f in done]
+                total = _merge(parts if total is None else [total, *parts])
+        if pending:
+            parts = [f.result() for f in pending]
+            total = _merge(parts if total is None else [total, *parts])
+
+    elapsed = time.perf_counter() - started
+    patients = int(total["patients"].sum() + total["skipped"].sum())
+    stats = {
+        "source": os.path.abspath(path),
+        "patients": patients,
+        "skipped": int(total["skipped"].sum()),
+        "chunks": len(ranges),
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "patients_per_second": round(patients / elapsed, 1),
+    }
+    return total, stats
+
+
+def rollup(total: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Sum the fine-grain table to `keys` and add means and shares."""
+    table = total[total["patients"] > 0].groupby(level=keys).sum().reset_index()
+    table = table.drop(columns=["skipped"])
+    counts = [c for c in table.columns if c not in keys and not c.endswith("_sum")]
+    table[counts] = table[counts].astype(np.int64)
+    patients = table["patients"]
+    for name in ["income", "household_size", "oop", "deduction", "top_cost"]:
+        table[f"mean_{name}"] = table.pop(f"{name}_sum") / patients
+    for column in ["free_care", "medicaid", "uninsured", *TOP_OPTION_COLUMNS]:
+        table[f"{column}_share"] = table[column] / patients
+    band_order = {band: i for i, band in enumerate(FPL_BANDS)}
+    return table.sort_values(
+        keys, key=lambda col: col.map(band_order) if col.name == "fpl_band" else col
+    ).reset_index(drop=True)
+
+
+def write_results(
+    total: pd.DataFrame, stats: dict, settings: dict, out_dir: str
+) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    source_hash = file_hash(stats["source"])
+    for name, keys in TABLES.items():
+        write_columns(rollup(total, keys), os.path.join(out_dir, name), source_hash)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump({**stats, "settings": settings, "tables": list(TABLES)}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default=PATIENTS_CSV)
+    parser.add_argument("--out", default=COHORT_OUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-mb", type=float, default=8.0, help="CSV MB per task")
+    parser.add_argument(
+        "--scaling", action="store_true", help="time 1, 2, 4 ... --workers and exit"
+    )
+    parser.add_argument(
+        "--oon-rate", type=float, default=0.1, help="share of patients out of network"
+    )
+    # Hospital policy and loan terms; defaults match /rank-options.
+    parser.add_argument("--free-care-threshold", type=float, default=100)
+    parser.add_argument("--discount-threshold", type=float, default=300)
+    parser.add_argument("--discount-percent", type=float, default=0)
+    parser.add_argument("--negotiation-rate", type=float, default=0.2)
+    parser.add_argument("--payment-plan-months", type=int, default=12)
+    parser.add_argument("--loan-apr", type=float, default=0.15)
+    parser.add_argument("--loan-term", type=int, default=24)
+    args = parser.parse_args()
+
+    settings = {
+        "reference_date": COHORT_REFERENCE_DATE,
+        "medicaid_fpl": COHORT_MEDICAID_FPL,
+        "oon_rate": args.oon_rate,
+        "free_care_threshold": args.free_care_threshold,
+        "discount_threshold": args.discount_threshold,
+        "discount_percent": args.discount_percent,
+        "negotiation_rate": args.negotiation_rate,
+        "payment_plan_months": args.payment_plan_months,
+        "loan_apr": args.loan_apr,
+        "loan_term": args.loan_term,
+    }
+    chunk_bytes = max(1, int(args.chunk_mb * 2**20))
+
+    if args.scaling:
+        counts = sorted(
+            {1, *[2**i for i in range(1, 8) if 2**i < args.workers], args.workers}
+        )
+        baseline = None
+        for workers in counts:
+            _, stats = run(args.csv, settings, workers, chunk_bytes)
+            baseline = baseline or stats["seconds"]
+            print(
+                f"{workers:3d} workers: {stats['seconds']:8.2f} s  "
+                f"{stats['patients_per_second']:10.0f} patients/s  "
+                f"speedup {baseline / stats['seconds']:.2f}x"
+            )
+        return
+
+    total, stats = run(args.csv, settings, args.workers, chunk_bytes)
+    write_results(total, stats, settings, args.out)
+    print(
+        f"✓ {stats['patients']} patients ({stats['skipped']} skipped) "
+        f"in {stats['seconds']} s "
+        f"with {stats['workers']} workers, {stats['chunks']} chunks "
+        f"({stats['patients_per_second']:.0f} patients/s) -> {args.out}"
+    )
+    by_band = read_frame(os.path.join(args.out, "by_fpl_band"))
+    columns = ["fpl_band", "patients", "mean_oop", "mean_deduction", "free_care_share"]
+    print(by_band[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
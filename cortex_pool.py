@@ -0,0 +1,238 @@
+"""
+Shared, long-lived connection pool for the Cortex vector database.
+
+Every module that talks to Cortex goes through this pool instead of opening a
+fresh AsyncCortexClient per request. The pool owns one background event loop,
+so Flask request threads hand their coroutines to `run()` rather than driving
+an event loop of their own.
+"""
+
+from cortex import AsyncCortexClient
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import threading
+import time
+
+CORTEX_SERVER = os.environ.get("CORTEX_SERVER", "localhost:50051")
+POOL_SIZE = int(os.environ.get("CORTEX_POOL_SIZE", "4"))
+# Idle connections are pinged at most this often. Keep it well above the
+# server's minimum ping interval to avoid too_many_pings / ENHANCE_YOUR_CALM.
+KEEPALIVE_SECONDS = float(os.environ.get("CORTEX_KEEPALIVE_SECONDS", "60"))
+HEALTH_TIMEOUT_SECONDS = float(os.environ.get("CORTEX_HEALTH_TIMEOUT_SECONDS", "5"))
+ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get("CORTEX_ACQUIRE_TIMEOUT_SECONDS", "10"))
+
+
+class CortexPool:
+    """Fixed-size pool of AsyncCortexClient connections.
+
+    Connections are opened lazily, health-checked when they have been idle
+    longer than the keepalive interval, and replaced after any failure.
+    """
+
+    def __init__(
+        self,
+        server: str = CORTEX_SERVER,
+        size: int = POOL_SIZE,
+        keepalive_seconds: float = KEEPALIVE_SECONDS,
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.server = server
+        self.size = size
+        self.keepalive_seconds = keepalive_seconds
+        self._idle: asyncio.Queue | None = None
+        self._last_used: dict = {}
+        self._keepalive_task: asyncio.Task | None = None
+        self._open = 0
+        self._stats = {
+            "acquires": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "failures": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+    # ----------------------------
+    # Connection lifecycle
+    # ----------------------------
+    def _ensure_started(self) -> asyncio.Queue:
+        if self._idle is None:
+            # None marks a free slot with no open connection yet.
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+            self._keepalive_task = asyncio.get_running_loop().create_task(
+                self._keepalive()
+            )
+        return self._idle
+
+    async def _connect(self) -> AsyncCortexClient:
+        client = AsyncCortexClient(self.server)
+        await client.__aenter__()
+        self._open += 1
+        self._stats["connects"] += 1
+        return client
+
+    async def _close(self, client: AsyncCortexClient) -> None:
+        self._last_used.pop(id(client), None)
+        self._open -= 1
+        try:
+            await client.__aexit__(None, None, None)
+        except Exception:
+            pass
+
+    async def _healthy(self, client: AsyncCortexClient) -> bool:
+        self._stats["health_checks"] += 1
+        try:
+            await asyncio.wait_for(client.health_check(), HEALTH_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    async def _keepalive(self) -> None:
+        """Ping connections that have sat idle for a full keepalive interval."""
+        while True:
+            await asyncio.sleep(self.keepalive_seconds)
+            idle = self._idle
+            # Only stale connections leave the queue, and each goes back as
+            # soon as its own check finishes, so acquire() is never starved
+            # by the sweep.
+            stale = []
+            for _ in range(idle.qsize()):
+                client = idle.get_nowait()
+                if client is not None and self._idle_for(client) >= self.keepalive_seconds:
+                    stale.append(client)
+                else:
+                    idle.put_nowait(client)
+            await asyncio.gather(*(self._refresh(client) for client in stale))
+
+    async def _refresh(self, client: AsyncCortexClient) -> None:
+        if await self._healthy(client):
+            self._last_used[id(client)] = time.monotonic()
+        else:
+            await self._close(client)
+            client = None
+        self._idle.put_nowait(client)
+
+    def _idle_for(self, client: AsyncCortexClient) -> float:
+        return time.monotonic() - self._last_used.get(id(client), 0.0)
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a live connection; it is discarded if the caller raises."""
+        idle = self._ensure_started()
+        started = time.monotonic()
+        client = await asyncio.wait_for(idle.get(), ACQUIRE_TIMEOUT_SECONDS)
+        self._stats["acquires"] += 1
+        self._stats["wait_seconds_total"] += time.monotonic() - started
+
+        try:
+            if client is not None and self._idle_for(client) >= self.keepalive_seconds:
+                if not await self._healthy(client):
+                    await self._close(client)
+                    client = None
+                    self._stats["reconnects"] += 1
+            if client is None:
+                client = await self._connect()
+        except BaseException:
+            idle.put_nowait(None)
+            raise
+
+        try:
+            yield client
+        except BaseException:
+            self._stats["failures"] += 1
+            await self._close(client)
+            idle.put_nowait(None)
+            raise
+        self._last_used[id(client)] = time.monotonic()
+        idle.put_nowait(client)
+
+    async def call(self, fn, retries: int = 1):
+        """Run `await fn(client)` on a pooled connection, reconnecting on failure."""
+        for attempt in range(retries + 1):
+            try:
+                async with self.acquire() as client:
+                    return await fn(client)
+            except asyncio.TimeoutError:
+                raise
+            except Exception:
+                if attempt == retries:
+                    raise
+                self._stats["reconnects"] += 1
+
+    async def close(self) -> None:
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+        if self._idle is not None:
+            while not self._idle.empty():
+                client = self._idle.get_nowait()
+                if client is not None:
+                    await self._close(client)
+        self._idle = None
+
+    def stats(self) -> dict:
+        idle = list(self._idle._queue) if self._idle is not None else []
+        acquires = self._stats["acquires"]
+        return {
+            "server": self.server,
+            "size": self.size,
+            "keepalive_seconds": self.keepalive_seconds,
+            "open": self._open,
+            "idle": sum(1 for c in idle if c is not None),
+            "in_use": self.size - len(idle) if self._idle is not None else 0,
+            **{k: v for k, v in self._stats.items() if k != "wait_seconds_total"},
+            "avg_wait_ms": (
+                round(self._stats["wait_seconds_total"] / acquires * 1000, 3)
+                if acquires
+                else 0.0
+            ),
+        }
+
+
+# -----------------------------
+# Shared loop + pool singleton
+# -----------------------------
+_lock = threading.Lock()
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_pid: int | None = None
+_pool: CortexPool | None = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Start the background loop thread (once per process, so it survives fork)."""
+    global _loop, _loop_pid, _pool
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="cortex-loop", daemon=True
+            ).start()
+            _loop_pid = os.getpid()
+            _pool = None
+        return _loop
+
+
+def get_pool() -> CortexPool:
+    global _pool
+    _get_loop()
+    with _lock:
+        if _pool is None:
+            _pool = CortexPool()
+        return _pool
+
+
+def run(coro, timeout: float | None = None):
+    """Run `coro` on the shared Cortex event loop from any thread."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
@@ -0,0 +1,94 @@
+"""
+Exact-match CPT code lookup.
+
+A dict from normalised cpt_code to its description and category, built from
+the ingested payloads (LOCAL_INDEX_DIR/payloads.json, written by
+vector_stuff.py) or, if nothing has been ingested yet, from the workbook via
+the columnar cache. Lookups need no embedding and no Cortex round trip. The
+index is rebuilt when payloads.json changes on disk.
+"""
+
+from data_cache import CPT_WORKBOOK, load_frame
+from local_index import LOCAL_INDEX_DIR, PAYLOADS_FILE
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+
+CPT_LOOKUP_MAX_CODES = int(os.environ.get("CPT_LOOKUP_MAX_CODES", "1000"))
+
+
+def normalize_code(code) -> str:
+    # Category III codes end in a letter ("0585T"); bills may lower-case it.
+    return str(code).strip().upper()
+
+
+class CptLookup:
+    def __init__(self, rows: List[dict], source: str):
+        self.source = source
+        self._rows: Dict[str, dict] = {
+            normalize_code(r["cpt_code"]): {
+                "cpt_code": normalize_code(r["cpt_code"]),
+                "procedure_code_description": r.get("procedure_code_description") or "",
+                "procedure_code_category": r.get("procedure_code_category") or "",
+            }
+            for r in rows
+        }
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, code) -> Optional[dict]:
+        return self._rows.get(normalize_code(code))
+
+    def get_many(self, codes: list) -> List[Optional[dict]]:
+        """One entry per input code, in order; None where the code is unknown."""
+        rows = self._rows
+        return [rows.get(normalize_code(code)) for code in codes]
+
+    @classmethod
+    def from_payloads(cls, path: str) -> "CptLookup":
+        with open(path) as f:
+            return cls(json.load(f)["payloads"], source=path)
+
+    @classmethod
+    def from_workbook(cls, path: str = CPT_WORKBOOK) -> "CptLookup":
+        df = load_frame(path)
+        rows = [
+            {
+                "cpt_code": code,
+                "procedure_code_description": description,
+                "procedure_code_category": category,
+            }
+            for code, description, category in zip(
+                df["CPT Codes"].astype(str),
+                df["Procedure Code Descriptions"].fillna(""),
+                df["Procedure Code Category"],
+            )
+        ]
+        return cls(rows, source=path)
+
+
+_lock = threading.Lock()
+_lookup: Optional[CptLookup] = None
+_payloads_mtime: Optional[float] = None
+
+
+def get_cpt_lookup() -> CptLookup:
+    """The shared index; rebuilt when the ingested payloads change."""
+    global _lookup, _payloads_mtime
+    path = os.path.join(LOCAL_INDEX_DIR, PAYLOADS_FILE)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    if _lookup is None or mtime != _payloads_mtime:
+        with _lock:
+            if _lookup is None or mtime != _payloads_mtime:
+                _lookup = (
+                    CptLookup.from_payloads(path)
+                    if mtime is not None
+                    else CptLookup.from_workbook()
+                )
+                _payloads_mtime = mtime
+    return _lookup
@@ -1,34 +1,47 @@
-from cortex import AsyncCortexClient, Filter, Field
-from sentence_transformers import SentenceTransformer
+from cortex import Filter, Field
+from category_router import ROUTER_ENABLED, get_router, record as record_route
+from cortex_pool import get_pool, run
+from embedding_service import encode_many, submit as submit_embedding
+from llm_cache import cached_completion
+from local_index import get_local_index
+from procedure_catalog import get_catalog
 from groq import Groq
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import asyncio
+import heapq
+import math
 import os
 import json
+import time
 
 COLLECTION_CPT = "cpt_codes"
-COLLECTION_PROC = "procedure_index"
-CORTEX_SERVER = "localhost:50051"
 GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+# Upper bound on in-flight per-category searches for one request, and the
+# deadline for each of them (including the wait for a pooled connection).
+SEARCH_CONCURRENCY = int(os.environ.get("CPT_SEARCH_CONCURRENCY", "8"))
+SEARCH_TIMEOUT_SECONDS = float(os.environ.get("CPT_SEARCH_TIMEOUT_SECONDS", "5"))
 
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+# "fanout": one filtered search per category. "overfetch": one unfiltered
+# search for top_k * CPT_OVERFETCH_FACTOR hits, filtered to the selected
+# categories in process and widened only when too few hits survive.
+SEARCH_MODES = ("fanout", "overfetch")
+DEFAULT_SEARCH_MODE = os.environ.get("CPT_SEARCH_MODE", "fanout")
+OVERFETCH_FACTOR = int(os.environ.get("CPT_OVERFETCH_FACTOR", "8"))
+OVERFETCH_MAX_LIMIT = int(os.environ.get("CPT_OVERFETCH_MAX_LIMIT", "1200"))
 
-# Reuse a single event loop across all Flask requests to avoid creating a new
-# gRPC channel on every call (which causes too_many_pings / ENHANCE_YOUR_CALM).
-_loop = asyncio.new_event_loop()
+# "cortex": search over gRPC, falling back to the local NumPy index (when one
+# has been exported by vector_stuff.py) if Cortex is unreachable.
+# "local": search the local index only.
+SEARCH_BACKENDS = ("cortex", "local")
+DEFAULT_SEARCH_BACKEND = os.environ.get("CPT_SEARCH_BACKEND", "cortex")
+LOCAL_FALLBACK = os.environ.get("CPT_LOCAL_FALLBACK", "1") == "1"
 
 
 class CategorySelection(BaseModel):
     selected_categories: List[str]
 
 
-async def get_procedure_index_entries(client: AsyncCortexClient) -> List[dict]:
-    """Retrieve all entries from the procedure_index collection."""
-    records, _ = await client.scroll(COLLECTION_PROC, limit=100, with_vectors=False)
-    return [r.payload for r in records if r.payload]
-
-
 def select_categories_via_llm(
     entries: List[dict], reason: str, groq_client: Groq
 ) -> List[str]:
@@ -41,7 +54,10 @@ def select_categories_via_llm(
         f"Available procedure categories:\n{entries_text}\n\n"
         f"Return only the procedure_code_category values that are relevant to this reason."
     )
-    response = groq_client.chat.completions.create(
+    selection = cached_completion(
+        "cpt_category_selection",
+        groq_client,
+        parse=CategorySelection.model_validate_json,
         messages=[{"role": "user", "content": prompt}],
         response_format={
             "type": "json_schema",
@@ -52,94 +68,225 @@ def select_categories_via_llm(
         },
         model=GROQ_MODEL,
     )
-    content = response.choices[0].message.content or ""
-    return CategorySelection.model_validate_json(content).selected_categories
-
-
-async def _pipeline(reason: str, top_k: int, groq_client: Groq) -> List[dict]:
-    async with AsyncCortexClient(CORTEX_SERVER) as client:
-        entries = await get_procedure_index_entries(client)
-        categories = select_categories_via_llm(entries, reason, groq_client)
-
-        query_vector = embed_model.encode(reason).tolist()
-
-        # BtrieveSpaceDriver only supports simple equality filters {"field": "value"}.
-        # $or and $in both fail (Error Code 62). Run one search per category and merge.
-        seen_codes: set = set()
-        all_results: List[dict] = []
-
-        if not categories:
-            results = await client.search(
-                COLLECTION_CPT,
-                query_vector,
-                top_k=top_k,
-                with_payload=True,
-            )
-            for r in results:
-                if r.payload:
-                    code = r.payload.get("cpt_code")
-                    if code not in seen_codes:
-                        seen_codes.add(code)
-                        all_results.append(
-                            {
-                                "cpt_code": code,
-                                "procedure_code_category": r.payload.get(
-                                    "procedure_code_category"
-                                ),
-                                "procedure_code_description": r.payload.get(
-                                    "procedure_code_description"
-                                ),
-                                "score": r.score,
-                            }
-                        )
-            all_results.sort(key=lambda x: x["score"], reverse=True)
-            return all_results[:top_k]
-
-        for cat in categories:
-            cat_filter = Filter().must(Field("procedure_code_category").eq(cat))
-            results = await client.search(
-                COLLECTION_CPT,
-                query_vector,
-                top_k=top_k,
-                filter=cat_filter,
-                with_payload=True,
-            )
-            for r in results:
-                if r.payload:
-                    code = r.payload.get("cpt_code")
-                    if code not in seen_codes:
-                        seen_codes.add(code)
-                        all_results.append(
-                            {
-                                "cpt_code": code,
-                                "procedure_code_category": r.payload.get(
-                                    "procedure_code_category"
-                                ),
-                                "procedure_code_description": r.payload.get(
-                                    "procedure_code_description"
-                                ),
-                                "score": r.score,
-                            }
-                        )
-
-    all_results.sort(key=lambda x: x["score"], reverse=True)
-    return all_results[:top_k]
-
-
-def search_cpt_by_reason(reason: str, top_k: int = 10, score_threshold: float = 0.5) -> List[dict]:
+    return selection.selected_categories
+
+
+def _to_result(r) -> dict:
+    return {
+        "cpt_code": r.payload.get("cpt_code"),
+        "procedure_code_category": r.payload.get("procedure_code_category"),
+        "procedure_code_description": r.payload.get("procedure_code_description"),
+        "score": r.score,
+    }
+
+
+def merge_top_k(result_lists: List[list], top_k: int) -> List[dict]:
+    """Merge per-category hits into one top-k list, keeping each code's best score."""
+    best: dict = {}
+    for results in result_lists:
+        for r in results:
+            if not r.payload:
+                continue
+            code = r.payload.get("cpt_code")
+            if code not in best or r.score > best[code]["score"]:
+                best[code] = _to_result(r)
+    return heapq.nlargest(top_k, best.values(), key=lambda x: x["score"])
+
+
+async def _search(query_vector: List[float], top_k: int, category: Optional[str] = None):
+    kwargs = {}
+    if category is not None:
+        kwargs["filter"] = Filter().must(Field("procedure_code_category").eq(category))
+
+    async def _run(client):
+        return await client.search(
+            COLLECTION_CPT, query_vector, top_k=top_k, with_payload=True, **kwargs
+        )
+
+    return await asyncio.wait_for(get_pool().call(_run), SEARCH_TIMEOUT_SECONDS)
+
+
+async def _fan_out(
+    query_vector: List[float], top_k: int, categories: List[str]
+) -> List[list]:
+    # BtrieveSpaceDriver only supports simple equality filters {"field": "value"}.
+    # $or and $in both fail (Error Code 62). Run one search per category and merge.
+    semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+
+    async def _bounded(cat: str):
+        async with semaphore:
+            return await _search(query_vector, top_k, cat)
+
+    outcomes = await asyncio.gather(
+        *(_bounded(cat) for cat in categories), return_exceptions=True
+    )
+    failures = [
+        (cat, o) for cat, o in zip(categories, outcomes) if isinstance(o, BaseException)
+    ]
+    if len(failures) == len(categories):
+        raise failures[0][1]
+    for cat, error in failures:
+        print(f"CPT search for category {cat!r} failed: {error!r}")
+    return [o for o in outcomes if not isinstance(o, BaseException)]
+
+
+async def _overfetch(
+    query_vector: List[float], top_k: int, categories: List[str]
+) -> List[list]:
+    wanted = set(categories)
+    limit = min(top_k * OVERFETCH_FACTOR, OVERFETCH_MAX_LIMIT)
+    while True:
+        results = await _search(query_vector, limit)
+        hits = [
+            r
+            for r in results
+            if r.payload and r.payload.get("procedure_code_category") in wanted
+        ]
+        # Stop once enough hits survive, the collection is exhausted, or the cap is hit.
+        if len(hits) >= top_k or len(results) < limit or limit >= OVERFETCH_MAX_LIMIT:
+            return [hits]
+        # Widen in proportion to how selective the categories turned out to be.
+        survival = max(len(hits), 1) / len(results)
+        widened = max(limit * 2, math.ceil(top_k / survival * 1.25))
+        limit = min(widened, OVERFETCH_MAX_LIMIT)
+
+
+async def _retrieve_cortex(
+    query_vector: List[float], top_k: int, categories: List[str], mode: str
+) -> List[dict]:
+    if not categories:
+        return merge_top_k([await _search(query_vector, top_k)], top_k)
+    if mode == "overfetch":
+        return merge_top_k(await _overfetch(query_vector, top_k, categories), top_k)
+    return merge_top_k(await _fan_out(query_vector, top_k, categories), top_k)
+
+
+def _retrieve_local(
+    query_vector: List[float], top_k: int, categories: List[str]
+) -> List[dict]:
+    index = get_local_index()
+    if index is None:
+        raise RuntimeError("Local CPT index has not been exported; run vector_stuff.py")
+    return index.search(query_vector, top_k, categories or None)
+
+
+async def retrieve(
+    query_vector: List[float],
+    top_k: int,
+    categories: List[str],
+    mode: str = DEFAULT_SEARCH_MODE,
+    backend: str = DEFAULT_SEARCH_BACKEND,
+    fallback: bool = LOCAL_FALLBACK,
+) -> List[dict]:
+    """Top-k CPT hits for `query_vector`, restricted to `categories` when given."""
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(
+            f"Unknown search backend {backend!r}; expected one of {SEARCH_BACKENDS}"
+        )
+    if backend == "local":
+        return _retrieve_local(query_vector, top_k, categories)
+    try:
+        return await _retrieve_cortex(query_vector, top_k, categories, mode)
+    except Exception as e:
+        if not fallback or get_local_index() is None:
+            raise
+        print(f"Cortex search failed ({e!r}); serving from the local CPT index")
+        return _retrieve_local(query_vector, top_k, categories)
+
+
+async def _select_categories(
+    entries: List[dict], reason: str, query_vector, groq_client: Groq
+) -> dict:
+    """Route locally first; only ask the LLM when the router is not confident."""
+    decision = None
+    if ROUTER_ENABLED and entries:
+        router = await asyncio.to_thread(get_router, entries, encode_many)
+        decision = router.route(query_vector)
+        if decision.confident:
+            return {
+                "categories": decision.categories,
+                "category_source": "router",
+                "router_confidence": decision.confidence,
+            }
+    categories = await asyncio.to_thread(
+        select_categories_via_llm, entries, reason, groq_client
+    )
+    return {
+        "categories": categories,
+        "category_source": "llm",
+        "router_confidence": decision.confidence if decision else None,
+    }
+
+
+async def _pipeline(
+    reason: str, top_k: int, groq_client: Groq, mode: str, backend: str
+) -> dict:
+    started = time.perf_counter()
+    entries = await get_catalog().get_entries()
+    # The encode (and the LLM call, if needed) is blocking; keep it off the shared
+    # loop so other requests' Cortex calls are not stalled behind it.
+    query_vector = await asyncio.wrap_future(submit_embedding(reason))
+    selection = await _select_categories(entries, reason, query_vector, groq_client)
+    results = await retrieve(
+        query_vector.tolist(), top_k, selection["categories"], mode, backend
+    )
+    elapsed = time.perf_counter() - started
+    record_route(selection["category_source"], elapsed)
+    return {**selection, "results": results, "elapsed_ms": round(elapsed * 1000, 2)}
+
+
+def search_cpt_with_meta(
+    reason: str,
+    top_k: int = 10,
+    score_threshold: float = 0.5,
+    mode: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> dict:
+    """
+    Like search_cpt_by_reason, but also reports how the request was served.
+
+    Returns:
+        Dict with keys: results, categories, category_source ("router" or
+        "llm"), router_confidence, elapsed_ms.
+    """
+    groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    outcome = run(
+        _pipeline(
+            reason,
+            top_k,
+            groq_client,
+            mode or DEFAULT_SEARCH_MODE,
+            backend or DEFAULT_SEARCH_BACKEND,
+        )
+    )
+    outcome["results"] = [r for r in outcome["results"] if r["score"] >= score_threshold]
+    return outcome
+
+
+def search_cpt_by_reason(
+    reason: str,
+    top_k: int = 10,
+    score_threshold: float = 0.5,
+    mode: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> List[dict]:
     """
     Two-stage CPT code retrieval:
-    1. Ask Groq to select relevant procedure_code_categories from the procedure_index.
+    1. Select relevant procedure_code_categories from the procedure_index, with the
+       local embedding router or, when it is not confident, the Groq LLM.
     2. Semantically search cpt_codes filtered to those categories.
 
     Args:
-        reason: Clinical reason or condition (used for both LLM selection and embedding).
+        reason: Clinical reason or condition (used for category selection and embedding).
         top_k:  Number of CPT code results to return.
+        mode:   "fanout" or "overfetch" (see SEARCH_MODES); defaults to CPT_SEARCH_MODE.
+        backend: "cortex" or "local" (see SEARCH_BACKENDS); defaults to
+                 CPT_SEARCH_BACKEND.
 
     Returns:
         List of dicts with keys: cpt_code, procedure_code_category,
         procedure_code_description, score.
     """
-    groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-    results = _loop.run_until_complete(_pipeline(reason, top_k, groq_client))
-    return [r for r in results if r["score"] >= score_threshold]
+    return search_cpt_with_meta(reason, top_k, score_threshold, mode, backend)["results"]
@@ -0,0 +1,214 @@
+"""
+Columnar cache for the tabular sources (CPT workbook sheets, patient CSV).
+
+The first load of a source parses it with pandas and writes one .npy file per
+column under DATA_CACHE_DIR/<source>/<sha256 of the file>/. Later loads
+memory-map those columns instead of going through openpyxl / the CSV parser.
+A source is re-hashed only when its size or mtime changes, and a new hash
+gets a fresh directory, so an edited workbook never serves stale columns.
+
+Numeric columns are stored as-is and come back as zero-copy memory maps from
+`load_columns`. Text columns are stored as fixed-width unicode, with a null
+mask where the source had blanks.
+
+Usage:
+    python data_cache.py                 # build/refresh every known source
+    python data_cache.py --rebuild       # force a re-parse
+"""
+
+from typing import Dict, List, Optional
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_CACHE_DIR = os.environ.get("DATA_CACHE_DIR", os.path.join(_HERE, "data_cache"))
+CPT_WORKBOOK = os.environ.get("CPT_WORKBOOK", os.path.join(_HERE, "cpt-pcm-nhsn.xlsx"))
+PATIENTS_CSV = os.environ.get(
+    "PATIENTS_CSV", os.path.join(_HERE, "patients_synthetic_5000.csv")
+)
+CURRENT_FILE = "current.json"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+# (path, sheet) pairs built by the CLI.
+KNOWN_SOURCES = [(CPT_WORKBOOK, 0), (CPT_WORKBOOK, 1), (PATIENTS_CSV, None)]
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _source_key(path: str, sheet: Optional[int]) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem if sheet is None else f"{stem}-sheet{sheet}"
+
+
+def _parse(path: str, sheet: Optional[int]) -> pd.DataFrame:
+    if path.endswith((".xlsx", ".xls")):
+        return pd.read_excel(path, sheet_name=sheet or 0, engine="openpyxl")
+    return pd.read_csv(path)
+
+
+def write_columns(df: pd.DataFrame, directory: str, source_hash: str) -> None:
+    """Replace `directory` with one .npy per column + manifest."""
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {"name": str(name), "file": f"col{i}.npy"}
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            values = series.to_numpy()
+        else:
+            nulls = series.isna().to_numpy()
+            values = series.where(~nulls, "").astype(str).to_numpy(dtype=str)
+            if nulls.any():
+                entry["nulls"] = f"col{i}.nulls.npy"
+                np.save(os.path.join(tmp_dir, entry["nulls"]), nulls)
+        np.save(os.path.join(tmp_dir, entry["file"]), values)
+        entry["dtype"] = values.dtype.str
+        columns.append(entry)
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump({"source_hash": source_hash, "rows": len(df), "columns": columns}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError:
+        # A peer published the same columns between our rmtree and replace.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            raise
+
+
+def _current(root: str) -> dict:
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _cached_directory(root: str, stat: os.stat_result) -> Optional[str]:
+    # Size + mtime unchanged: trust the recorded hash without reading the file.
+    current = _current(root)
+    if (
+        current.get("size") == stat.st_size
+        and current.get("mtime_ns") == stat.st_mtime_ns
+        and os.path.exists(os.path.join(root, current.get("hash", ""), MANIFEST_FILE))
+    ):
+        return os.path.join(root, current["hash"])
+    return None
+
+
+def ensure_cached(path: str, sheet: Optional[int] = None, rebuild: bool = False) -> str:
+    """Build the cache for `path` if needed; returns its column directory."""
+    root = os.path.join(DATA_CACHE_DIR, _source_key(path, sheet))
+    stat = os.stat(path)
+    directory = None if rebuild else _cached_directory(root, stat)
+    if directory:
+        return directory
+
+    os.makedirs(root, exist_ok=True)
+    # Gunicorn workers warm up at the same time; one builds, the rest wait
+    # and then take the fast path.
+    with open(os.path.join(root, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        directory = None if rebuild else _cached_directory(root, stat)
+        if directory:
+            return directory
+
+        source_hash = file_hash(path)
+        directory = os.path.join(root, source_hash)
+        if rebuild or not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+            write_columns(_parse(path, sheet), directory, source_hash)
+
+        tmp_path = os.path.join(root, f".{CURRENT_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"hash": source_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+                f,
+            )
+        os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+        # Completed columns for older versions of the source are no longer
+        # reachable; in-progress .tmp-<pid> builds are left alone.
+        for name in os.listdir(root):
+            if (
+                name != source_hash
+                and ".tmp-" not in name
+                and os.path.exists(os.path.join(root, name, MANIFEST_FILE))
+            ):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return directory
+
+
+def load_columns(
+    path: str, sheet: Optional[int] = None, columns: Optional[List[str]] = None
+) -> Dict[str, np.ndarray]:
+    """Memory-mapped column arrays for `path` (text columns have "" for blanks)."""
+    directory = ensure_cached(path, sheet)
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    return {
+        entry["name"]: np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+        for entry in manifest["columns"]
+        if columns is None or entry["name"] in columns
+    }
+
+
+def read_frame(directory: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """DataFrame from a directory written by `write_columns`."""
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    data = {}
+    for entry in manifest["columns"]:
+        if columns is not None and entry["name"] not in columns:
+            continue
+        values = np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+        if values.dtype.kind == "U":
+            values = values.astype(object)
+            if "nulls" in entry:
+                values[np.load(os.path.join(directory, entry["nulls"]))] = np.nan
+        data[entry["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def load_frame(
+    path: str, sheet: Optional[int] = None, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Same DataFrame pandas would parse from `path`, read from the cache."""
+    return read_frame(ensure_cached(path, sheet), columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar data cache")
+    parser.add_argument("--rebuild", action="store_true", help="re-parse every source")
+    args = parser.parse_args()
+    for path, sheet in KNOWN_SOURCES:
+        label = _source_key(path, sheet)
+        started = time.perf_counter()
+        _parse(path, sheet)
+        parse_ms = (time.perf_counter() - started) * 1000
+        directory = ensure_cached(path, sheet, rebuild=args.rebuild)
+        started = time.perf_counter()
+        frame = load_frame(path, sheet)
+        load_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"✓ {label}: {len(frame)} rows x {len(frame.columns)} columns in "
+            f"{directory} (parse {parse_ms:.1f} ms, cached load {load_ms:.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Shared embedding model with micro-batching and a query-embedding cache.
+
+Single-string encodes from request threads are queued; a worker thread
+collects everything that arrives within EMBED_MAX_WAIT_MS of the first
+queued request (up to EMBED_MAX_BATCH texts) and runs it as one batched
+forward pass through the model.
+
+Before anything is queued, the normalised text is looked up in a bounded LRU
+and, if EMBED_CACHE_PATH is set, an SQLite store that survives restarts.
+Cache keys include the model name and backend, so swapping either invalidates them.
+
+The model itself is loaded on first use (`get_model`), so importing this
+module does not pull in torch. `preload()` loads it up front; gunicorn.conf.py
+calls it in the master before forking so workers share the weights.
+
+EMBEDDING_BACKEND selects how the model runs: "torch" (full-precision
+PyTorch) or "onnx", an int8-quantized ONNX export of the same model run by
+onnxruntime with the same tokenizer. bench_embeddings.py checks the cosine
+drift between the two and compares their latency and memory.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from startup_timing import record as record_startup
+from typing import Callable, List, Optional
+import os
+import queue
+import sqlite3
+import threading
+import time
+import numpy as np
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKENDS = ("torch", "onnx")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# Quantized export to load for the onnx backend: a file inside the model repo
+# (all-MiniLM-L6-v2 ships several under onnx/) or one written by export_onnx.py.
+# quint8_avx2 runs on any x86-64 CPU; use an avx512/vnni file where available.
+EMBEDDING_ONNX_FILE = os.environ.get(
+    "EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx"
+)
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.environ.get("EMBED_MAX_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "4096"))
+# Empty disables the on-disk store.
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "")
+
+
+def model_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """Model name plus backend; vectors from different backends are not mixed."""
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL}:onnx:{EMBEDDING_ONNX_FILE}"
+    return EMBEDDING_MODEL
+
+
+def load_model(backend: str = EMBEDDING_BACKEND):
+    """Build a SentenceTransformer for `backend` (not cached; see get_model)."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}"
+        )
+    # Imported here: sentence_transformers pulls in torch, which dominates
+    # import time.
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        # Needs onnxruntime + optimum (pip install "sentence-transformers[onnx]").
+        return SentenceTransformer(
+            EMBEDDING_MODEL,
+            backend="onnx",
+            model_kwargs={"file_name": EMBEDDING_ONNX_FILE},
+        )
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """The process-wide SentenceTransformer, loaded on first call."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                _model = load_model()
+                record_startup("embedding_model", time.perf_counter() - started)
+    return _model
+
+
+def preload() -> None:
+    """Load the model now instead of on the first request."""
+    get_model()
+
+
+def model_loaded() -> bool:
+    return _model is not None
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        get_model: Callable,
+        max_batch_size: int = EMBED_MAX_BATCH,
+        max_wait_ms: float = EMBED_MAX_WAIT_MS,
+    ):
+        self.get_model = get_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "errors": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "encode_seconds_total": 0.0,
+        }
+        self._batch_sizes: dict = {}
+
+    def _ensure_worker(self) -> None:
+        # Threads do not survive fork, so start one per process.
+        if self._worker_pid != os.getpid():
+            with self._lock:
+                if self._worker_pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(
+                        target=self._run, name="embedding-batcher", daemon=True
+                    ).start()
+                    self._worker_pid = os.getpid()
+
+    def submit(self, text: str) -> Future:
+        """Queue `text` for the next batch; the future resolves to its vector."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # Drop futures cancelled while queued; the rest can no longer be
+            # cancelled, so set_result/set_exception below cannot raise.
+            batch = [
+                item for item in self._collect() if item[1].set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                vectors = self.get_model().encode(
+                    [text for text, _, _ in batch], batch_size=len(batch)
+                )
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.monotonic()
+
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            waits = [started - queued for _, _, queued in batch]
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["queue_wait_seconds_total"] += sum(waits)
+                self._stats["queue_wait_seconds_max"] = max(
+                    self._stats["queue_wait_seconds_max"], *waits
+                )
+                self._stats["encode_seconds_total"] += finished - started
+                size = len(batch)
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            sizes = dict(self._batch_sizes)
+        requests, batches = stats["requests"], stats["batches"]
+        return {
+            "model": EMBEDDING_MODEL,
+            "backend": EMBEDDING_BACKEND,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": requests,
+            "batches": batches,
+            "errors": stats["errors"],
+            "queued": self._queue.qsize(),
+            "avg_batch_size": round(requests / batches, 2) if batches else 0.0,
+            "batch_size_histogram": {str(k): sizes[k] for k in sorted(sizes)},
+            "avg_queue_wait_ms": (
+                round(stats["queue_wait_seconds_total"] / requests * 1000, 3)
+                if requests
+                else 0.0
+            ),
+            "max_queue_wait_ms": round(stats["queue_wait_seconds_max"] * 1000, 3),
+            "avg_encode_ms_per_batch": (
+                round(stats["encode_seconds_total"] / batches * 1000, 3)
+                if batches
+                else 0.0
+            ),
+        }
+
+
+def normalize_text(text: str) -> str:
+    # all-MiniLM-L6-v2 uses an uncased tokenizer, so case and runs of
+    # whitespace do not change the embedding.
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """LRU of normalised text -> vector, optionally backed by SQLite."""
+
+    def __init__(
+        self,
+        model_name: str = model_id(),
+        capacity: int = EMBED_CACHE_SIZE,
+        path: str = EMBED_CACHE_PATH,
+    ):
+        self.model_name = model_name
+        self.capacity = capacity
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        # SQLite connections must not be shared across fork (gunicorn
+        # preload_app); reopen per process.
+        if not self.path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(model TEXT, text TEXT, vector BLOB, PRIMARY KEY (model, text))"
+            )
+            # Vectors from any other model are stale.
+            self._db.execute(
+                "DELETE FROM embeddings WHERE model != ?", (self.model_name,)
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(text)
+            if vector is not None:
+                self._memory.move_to_end(text)
+                self._stats["memory_hits"] += 1
+                return vector
+            db = self._conn()
+            if db is not None:
+                row = db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text = ?",
+                    (self.model_name, text),
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(text, vector)
+                    self._stats["disk_hits"] += 1
+                    return vector
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, text: str, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(text, vector)
+            db = self._conn()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                    (self.model_name, text, vector.tobytes()),
+                )
+                db.commit()
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        vector.flags.writeable = False
+        self._memory[text] = vector
+        self._memory.move_to_end(text)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._memory)
+        lookups = sum(stats.values())
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        return {
+            "model": self.model_name,
+            "capacity": self.capacity,
+            "size": size,
+            "persistent": bool(self.path),
+            **stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+_batcher = EmbeddingBatcher(get_model)
+_cache = EmbeddingCache()
+_inflight: dict = {}
+_inflight_lock = threading.Lock()
+
+
+def submit(text: str) -> Future:
+    """Resolve `text` from the cache, or queue it for the next batch."""
+    key = normalize_text(text)
+    vector = _cache.get(key)
+    if vector is not None:
+        future: Future = Future()
+        future.set_result(vector)
+        return future
+
+    # Identical concurrent misses share one encode.
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        future = _batcher.submit(key)
+        _inflight[key] = future
+
+    def _store(done: Future) -> None:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        if done.exception() is None:
+            _cache.put(key, done.result())
+
+    future.add_done_callback(_store)
+    return future
+
+
+def encode(text: str) -> np.ndarray:
+    """Embed one string, sharing a forward pass with concurrent callers."""
+    return submit(text).result()
+
+
+def encode_many(texts: List[str], **kwargs) -> np.ndarray:
+    """Embed a list directly (bulk callers already have a full batch)."""
+    return get_model().encode(texts, **kwargs)
+
+
+def embedding_stats() -> dict:
+    return {
+        **_batcher.stats(),
+        "model_loaded": model_loaded(),
+        "cache": _cache.stats(),
+    }
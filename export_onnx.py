@@ -0,0 +1,47 @@
+"""
+Export EMBEDDING_MODEL to ONNX and quantize it to int8 for the onnx backend.
+
+all-MiniLM-L6-v2 already ships quantized files under onnx/ in its model repo,
+so this is only needed for other models or other quantization targets.
+
+Usage:
+    python export_onnx.py --output onnx_model [--target avx2|avx512|avx512_vnni|arm64]
+
+Then run with EMBEDDING_MODEL=onnx_model EMBEDDING_BACKEND=onnx and
+EMBEDDING_ONNX_FILE set to the file it prints (e.g. onnx/model_quint8_avx2.onnx).
+"""
+
+from embedding_service import EMBEDDING_MODEL
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an int8 ONNX embedding model")
+    parser.add_argument("--output", required=True, help="directory to save the model to")
+    parser.add_argument(
+        "--target",
+        default="avx2",
+        choices=["avx2", "avx512", "avx512_vnni", "arm64"],
+        help="CPU instruction set the quantized kernels are tuned for",
+    )
+    args = parser.parse_args()
+
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    # backend="onnx" exports the fp32 graph; the tokenizer is saved alongside
+    # it, so the quantized model tokenizes exactly like the torch one.
+    model = SentenceTransformer(EMBEDDING_MODEL, backend="onnx")
+    model.save_pretrained(args.output)
+    export_dynamic_quantized_onnx_model(model, args.target, args.output)
+    onnx_dir = os.path.join(args.output, "onnx")
+    for name in sorted(os.listdir(onnx_dir)):
+        if args.target in name:
+            print(f"✓ Wrote {os.path.join('onnx', name)} in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
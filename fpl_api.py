@@ -1,11 +1,16 @@
 from flask import Flask, jsonify, request
+from fpl_batch import (
+    FPL_BASE,
+    FPL_BATCH_MAX_ROWS,
+    FPL_PER_EXTRA,
+    compute_fpl_batch,
+    get_discount,
+    parse_households,
+    to_json_columns,
+)
 
 app = Flask(__name__)
 
-# 2026 Federal Poverty Levels
-FPL_BASE = 15960
-FPL_PER_EXTRA = 5680
-
 def get_fpl(household_size):
     if household_size < 1:
         raise ValueError("Household size must be at least 1")
@@ -14,13 +19,6 @@ def get_fpl(household_size):
 def get_fpl_percentage(annual_income, household_size):
     return (annual_income / get_fpl(household_size)) * 100
 
-def get_discount(fpl_pct):
-    if fpl_pct <= 100:   return 100
-    elif fpl_pct <= 200: return 75
-    elif fpl_pct <= 300: return 50
-    elif fpl_pct <= 400: return 25
-    else:                return 0
-
 @app.route("/fpl-discount", methods=["POST"])
 def fpl_discount():
     data = request.get_json()
@@ -47,5 +45,19 @@ def fpl_discount():
         "estimated_deduction_amount": round(deduction_amount, 2)
     })
 
+@app.route("/fpl-discount/batch", methods=["POST"])
+def fpl_discount_batch():
+    try:
+        default_size = request.args.get("default_household_size", type=int)
+        incomes, household_sizes = parse_households(
+            request.get_data(), request.content_type, default_size
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(incomes) > FPL_BATCH_MAX_ROWS:
+        return jsonify({"error": f"At most {FPL_BATCH_MAX_ROWS} households per request"}), 400
+
+    return jsonify(to_json_columns(compute_fpl_batch(incomes, household_sizes)))
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
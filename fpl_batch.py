@@ -0,0 +1,209 @@
+"""
+Vectorized FPL discount screening for whole cohorts.
+
+`compute_fpl_batch` takes arrays of incomes and household sizes and returns
+the same fields as the scalar /fpl-discount path (get_fpl,
+get_fpl_percentage, get_discount in app.py / fpl_api.py), one NumPy column
+each. The discount tier is a `searchsorted` over FPL_DISCOUNT_BREAKPOINTS.
+
+`parse_households` reads the request body of /fpl-discount/batch: columnar
+JSON, CSV, or JSON lines.
+
+Run `python fpl_batch.py` to check parity with the scalar path over
+patients_synthetic_5000.csv and time both.
+"""
+
+from typing import Dict, Optional, Tuple
+import io
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# 2026 Federal Poverty Levels (from healthcare.gov); app.py and fpl_api.py
+# import these.
+FPL_BASE = 15960
+FPL_PER_EXTRA = 5680
+
+# Income as % of FPL up to and including each breakpoint gets the matching
+# discount; above the last breakpoint gets the final entry.
+FPL_DISCOUNT_BREAKPOINTS = np.array(
+    [float(x) for x in os.environ.get("FPL_DISCOUNT_BREAKPOINTS", "100,200,300,400").split(",")]
+)
+FPL_DISCOUNT_PERCENTS = np.array(
+    [int(x) for x in os.environ.get("FPL_DISCOUNT_PERCENTS", "100,75,50,25,0").split(",")]
+)
+if len(FPL_DISCOUNT_PERCENTS) != len(FPL_DISCOUNT_BREAKPOINTS) + 1:
+    raise ValueError("FPL_DISCOUNT_PERCENTS needs one more entry than the breakpoints")
+FPL_BATCH_MAX_ROWS = int(os.environ.get("FPL_BATCH_MAX_ROWS", "100000"))
+
+INCOME_COLUMNS = ("income", "annual_income")
+HOUSEHOLD_COLUMNS = ("household_size",)
+
+
+def get_discount(fpl_pct: float) -> int:
+    """Hospital discount percent for one household's % of FPL."""
+    tier = int(np.searchsorted(FPL_DISCOUNT_BREAKPOINTS, fpl_pct, side="left"))
+    return int(FPL_DISCOUNT_PERCENTS[min(tier, len(FPL_DISCOUNT_PERCENTS) - 1)])
+
+
+def compute_fpl_batch(incomes, household_sizes) -> Dict[str, np.ndarray]:
+    """
+    FPL threshold, % of FPL, discount tier and deduction for every household.
+
+    Rows with a household size below 1, a negative income, or a missing value
+    get `valid` False and NaN results instead of failing the whole batch.
+    """
+    incomes = np.asarray(incomes, dtype=np.float64)
+    sizes = np.asarray(household_sizes, dtype=np.float64)
+    if incomes.shape != sizes.shape or incomes.ndim != 1:
+        raise ValueError("incomes and household_sizes must be 1-D and the same length")
+
+    valid = (sizes >= 1) & (incomes >= 0) & (sizes == np.floor(sizes))
+    sizes = np.where(valid, sizes, 1).astype(np.int64)
+
+    fpl = FPL_BASE + FPL_PER_EXTRA * (sizes - 1)
+    fpl_pct = incomes / fpl * 100
+    # side="left": a percentage equal to a breakpoint belongs to that tier,
+    # matching the scalar `fpl_pct <= 100` comparisons.
+    tiers = np.searchsorted(FPL_DISCOUNT_BREAKPOINTS, fpl_pct, side="left")
+    discount = FPL_DISCOUNT_PERCENTS[np.minimum(tiers, len(FPL_DISCOUNT_PERCENTS) - 1)]
+    deduction = discount / 100 * incomes
+
+    invalid = ~valid
+    return {
+        "valid": valid,
+        "household_size": np.where(valid, sizes, 0),
+        "annual_income": incomes,
+        "fpl_threshold": np.where(valid, fpl, 0),
+        "fpl_percentage": np.where(invalid, np.nan, np.round(fpl_pct, 1)),
+        "hospital_discount_percent": np.where(valid, discount, 0),
+        "estimated_deduction_amount": np.where(invalid, np.nan, np.round(deduction, 2)),
+    }
+
+
+def _pick(df: pd.DataFrame, names: Tuple[str, ...]) -> Optional[pd.Series]:
+    lowered = {str(c).strip().lower(): c for c in df.columns}
+    for name in names:
+        if name in lowered:
+            return df[lowered[name]]
+    return None
+
+
+def parse_households(
+    body: bytes, content_type: str, default_household_size: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (incomes, household_sizes) from a request body.
+
+    Accepts columnar JSON ({"incomes": [...], "household_sizes": [...]}), CSV
+    (text/csv) or JSON lines (application/x-ndjson), one household per row.
+    Column names are case-insensitive ("INCOME" in the patient CSV works).
+    `default_household_size` fills in when the input has no size column.
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        df = pd.read_csv(io.BytesIO(body))
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        df = pd.read_json(io.BytesIO(body), lines=True)
+    else:
+        data = json.loads(body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("JSON body must be an object with incomes/household_sizes")
+        incomes = data.get("incomes")
+        sizes = data.get("household_sizes")
+        if sizes is None and incomes is not None and default_household_size:
+            sizes = [default_household_size] * len(incomes)
+        if not isinstance(incomes, list) or not isinstance(sizes, list):
+            raise ValueError("Provide 'incomes' and 'household_sizes' lists")
+        if len(incomes) != len(sizes):
+            raise ValueError("'incomes' and 'household_sizes' must be the same length")
+        return (
+            pd.to_numeric(pd.Series(incomes), errors="coerce").to_numpy(np.float64),
+            pd.to_numeric(pd.Series(sizes), errors="coerce").to_numpy(np.float64),
+        )
+
+    incomes = _pick(df, INCOME_COLUMNS)
+    sizes = _pick(df, HOUSEHOLD_COLUMNS)
+    if incomes is None:
+        raise ValueError(f"Input needs one of the columns {list(INCOME_COLUMNS)}")
+    if sizes is None:
+        if not default_household_size:
+            raise ValueError(
+                "Input has no household_size column; pass default_household_size"
+            )
+        sizes = pd.Series(np.full(len(df), default_household_size))
+    return (
+        pd.to_numeric(incomes, errors="coerce").to_numpy(np.float64),
+        pd.to_numeric(sizes, errors="coerce").to_numpy(np.float64),
+    )
+
+
+def to_json_columns(result: Dict[str, np.ndarray]) -> dict:
+    """Columnar JSON response; NaN (invalid rows) becomes null."""
+    columns = {}
+    for name, values in result.items():
+        if values.dtype.kind == "f":
+            columns[name] = [None if np.isnan(v) else v for v in values.tolist()]
+        else:
+            columns[name] = values.tolist()
+    valid = result["valid"]
+    return {
+        "rows": int(len(valid)),
+        "invalid_rows": int((~valid).sum()),
+        "columns": columns,
+    }
+
+
+if __name__ == "__main__":
+    # Parity + timing against the scalar functions the endpoints use.
+    from data_cache import PATIENTS_CSV, load_columns
+    from fpl_api import get_fpl, get_fpl_percentage
+    import time
+
+    incomes = np.asarray(load_columns(PATIENTS_CSV, columns=["INCOME"])["INCOME"])
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 9, len(incomes))
+    # Exact tier boundaries, where <= vs < matters.
+    edge_sizes = np.arange(1, 9).repeat(len(FPL_DISCOUNT_BREAKPOINTS))
+    edge_incomes = (
+        (FPL_BASE + FPL_PER_EXTRA * (edge_sizes - 1))
+        * np.tile(FPL_DISCOUNT_BREAKPOINTS, 8)
+        / 100
+    )
+    incomes = np.concatenate([incomes, edge_incomes, rng.uniform(0, 80000, 5000)])
+    sizes = np.concatenate([sizes, edge_sizes, rng.integers(1, 9, 5000)])
+
+    started = time.perf_counter()
+    scalar = []
+    for income, size in zip(incomes.tolist(), sizes.tolist()):
+        pct = get_fpl_percentage(income, size)
+        # The tier rule written out, independent of the searchsorted above.
+        discount = next(
+            (
+                int(percent)
+                for breakpoint, percent in zip(FPL_DISCOUNT_BREAKPOINTS, FPL_DISCOUNT_PERCENTS)
+                if pct <= breakpoint
+            ),
+            int(FPL_DISCOUNT_PERCENTS[-1]),
+        )
+        scalar.append((get_fpl(size), round(pct, 1), discount, round(discount / 100 * income, 2)))
+    scalar_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    batch = compute_fpl_batch(incomes, sizes)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    mismatches = sum(
+        1
+        for i, (fpl, pct, discount, deduction) in enumerate(scalar)
+        if (
+            fpl != batch["fpl_threshold"][i]
+            or abs(pct - batch["fpl_percentage"][i]) > 1e-9
+            or discount != batch["hospital_discount_percent"][i]
+            or abs(deduction - batch["estimated_deduction_amount"][i]) > 0.005
+        )
+    )
+    print(f"{len(incomes)} households: scalar {scalar_ms:.1f} ms, batch {batch_ms:.2f} ms")
+    print(f"mismatches vs scalar path: {mismatches}")
+    raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for app.py:
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Import app.py once in the master. Workers are forked from it and share its
+# memory copy-on-write, so N workers hold one copy of the embedding model.
+preload_app = True
+# Warm-up opens connections and starts threads, none of which survive fork,
+# so it runs in each worker (post_fork) rather than in the master.
+os.environ.setdefault("WARMUP_ON_IMPORT", "0")
+
+
+def when_ready(server):
+    # Runs in the master after app.py is imported and before any worker is
+    # forked. Only the weights are loaded here; running inference in the
+    # master would start torch's thread pool, which does not survive fork.
+    from embedding_service import preload
+    from startup_timing import startup_report
+
+    preload()
+    for entry in startup_report()["phases"]:
+        server.log.info("startup %-24s %10.2f ms", entry["phase"], entry["ms"])
+
+
+def post_fork(server, worker):
+    # The worker is not ready (GET /ready returns 503) until this finishes.
+    from warmup import start_warm_up
+
+    start_warm_up()
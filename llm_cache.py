@@ -0,0 +1,198 @@
+"""
+Persistent cache for Groq chat completions.
+
+Every Groq call site goes through `cached_completion`, which keys on the full
+request (model, messages, response_format schema, temperature, ...) and keeps
+the response content in a local SQLite file. Entries expire after
+LLM_CACHE_TTL_SECONDS and the oldest rows are evicted once the table grows
+past LLM_CACHE_MAX_ENTRIES; expired rows are also purged whenever a process
+opens the file. A hit is a single read, so concurrent workers (WAL mode) do
+not queue behind disk writes. The cache is best-effort: if SQLite fails
+(locked, read-only directory, ...) the completion simply runs uncached. Hit
+rates are tracked per call site.
+
+Call sites whose replies carry PHI (insurance card extractions) pass
+persist=False: they are cached in an in-memory SQLite database for
+INSURANCE_CACHE_TTL_SECONDS and never written to disk.
+"""
+
+from typing import Any, Callable, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3"),
+)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(7 * 86400)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "20000"))
+# Extracted member details are PHI; keep cached extractions only briefly.
+INSURANCE_CACHE_TTL_SECONDS = float(os.environ.get("INSURANCE_CACHE_TTL_SECONDS", "3600"))
+
+
+class UnparsableCompletion(ValueError):
+    """The model's reply did not parse; `content` holds the raw text."""
+
+    def __init__(self, content: str):
+        super().__init__("Failed to parse Groq response")
+        self.content = content
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._sites: dict = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared across fork; reopen per process.
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL lets gunicorn workers read while another one writes.
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            # accessed_at is no longer read; kept so older files still load.
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, call_site TEXT, content TEXT, "
+                "created_at REAL, expires_at REAL, accessed_at REAL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS completions_created "
+                "ON completions (created_at)"
+            )
+            db.execute("DELETE FROM completions WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    @staticmethod
+    def make_key(request: dict) -> str:
+        canonical = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _count(self, call_site: str, field: str) -> None:
+        site = self._sites.setdefault(call_site, {"hits": 0, "misses": 0})
+        site[field] += 1
+
+    def get(self, key: str, call_site: str) -> Optional[str]:
+        """Unexpired content for `key`; expired rows are left for put/open to purge."""
+        with self._lock:
+            try:
+                row = self._conn().execute(
+                    "SELECT content FROM completions WHERE key = ? AND expires_at > ?",
+                    (key, time.time()),
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Warning: LLM cache read failed ({call_site}): {e}")
+                self._db = None  # reopen on the next call
+                row = None
+            self._count(call_site, "misses" if row is None else "hits")
+            return None if row is None else row[0]
+
+    def put(
+        self, key: str, call_site: str, content: str, ttl_seconds: Optional[float] = None
+    ) -> None:
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            try:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, call_site, content, now, now + ttl, now),
+                )
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: LLM cache write failed ({call_site}): {e}")
+                self._db = None  # drops the failed transaction; reopen next call
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+        (count,) = db.execute("SELECT COUNT(*) FROM completions").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY created_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            sites = {name: dict(counts) for name, counts in self._sites.items()}
+            try:
+                (entries,) = self._conn().execute(
+                    "SELECT COUNT(*) FROM completions"
+                ).fetchone()
+            except sqlite3.Error:
+                entries = None
+        for counts in sites.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = round(counts["hits"] / lookups, 4) if lookups else None
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "call_sites": sites,
+        }
+
+
+_cache = LLMCache()
+_memory_cache = LLMCache(":memory:")
+
+
+def cached_completion(
+    call_site: str,
+    client,
+    parse: Callable[[str], Any] = lambda content: content,
+    ttl_seconds: Optional[float] = None,
+    persist: bool = True,
+    **request,
+) -> Any:
+    """
+    Run `client.chat.completions.create(**request)` through the cache.
+
+    `parse` turns the message content into the caller's result; content is
+    only stored when it parses, so a malformed completion is never replayed.
+    With persist=False the content is kept in process memory only.
+    Raises UnparsableCompletion when `parse` fails.
+    """
+    cache = _cache if persist else _memory_cache
+    key = LLMCache.make_key(request) if LLM_CACHE_ENABLED else None
+    if key is not None:
+        content = cache.get(key, call_site)
+        if content is not None:
+            return parse(content)
+
+    response = client.chat.completions.create(**request)
+    content = response.choices[0].message.content or ""
+    try:
+        result = parse(content)
+    except Exception as e:
+        raise UnparsableCompletion(content) from e
+    if key is not None:
+        cache.put(key, call_site, content, ttl_seconds)
+    return result
+
+
+def llm_cache_stats() -> dict:
+    stats = _cache.stats()
+    stats["in_memory"] = _memory_cache.stats()
+    return stats
@@ -0,0 +1,187 @@
+"""
+In-process NumPy index over the cpt_codes embeddings.
+
+vector_stuff.py exports the catalog as LOCAL_INDEX_DIR/embeddings.npy
+(float32, L2-normalised, one row per CPT code) plus payloads.json, and a
+procedure_index.json snapshot for the procedure catalog. The array
+is memory-mapped, cosine top-k is a single matrix-vector product, and each
+procedure_code_category has a precomputed boolean row mask.
+
+Run `python local_index.py` to compare local results against Cortex.
+"""
+
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+LOCAL_INDEX_DIR = os.environ.get(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cpt_index"),
+)
+EMBEDDINGS_FILE = "embeddings.npy"
+PAYLOADS_FILE = "payloads.json"
+PROCEDURE_INDEX_FILE = "procedure_index.json"
+
+
+def export_index(
+    embeddings, payloads: List[dict], directory: str = LOCAL_INDEX_DIR
+) -> str:
+    """Write embeddings + payloads for LocalIndex; returns the version stamp."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2 or len(matrix) != len(payloads):
+        raise ValueError("embeddings must be a 2-D array with one row per payload")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+
+    digest = hashlib.sha256(matrix.tobytes())
+    digest.update(json.dumps(payloads, sort_keys=True, default=str).encode())
+    version = digest.hexdigest()[:16]
+
+    os.makedirs(directory, exist_ok=True)
+    # Write to temp names then rename, so a running server never maps a
+    # half-written file.
+    tmp_emb = os.path.join(directory, f".{EMBEDDINGS_FILE}.tmp")
+    tmp_pay = os.path.join(directory, f".{PAYLOADS_FILE}.tmp")
+    with open(tmp_emb, "wb") as f:
+        np.save(f, matrix)
+    with open(tmp_pay, "w") as f:
+        json.dump({"version": version, "payloads": payloads}, f, default=str)
+    os.replace(tmp_emb, os.path.join(directory, EMBEDDINGS_FILE))
+    os.replace(tmp_pay, os.path.join(directory, PAYLOADS_FILE))
+    return version
+
+
+def export_procedure_index(
+    entries: List[dict], directory: str = LOCAL_INDEX_DIR
+) -> None:
+    """Snapshot procedure_index payloads so the catalog can load without Cortex."""
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{PROCEDURE_INDEX_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, default=str)
+    os.replace(tmp_path, os.path.join(directory, PROCEDURE_INDEX_FILE))
+
+
+def load_procedure_index(directory: str = LOCAL_INDEX_DIR) -> List[dict]:
+    with open(os.path.join(directory, PROCEDURE_INDEX_FILE)) as f:
+        return json.load(f)
+
+
+class LocalIndex:
+    def __init__(self, directory: str = LOCAL_INDEX_DIR):
+        self.directory = directory
+        self.embeddings = np.load(
+            os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        with open(os.path.join(directory, PAYLOADS_FILE)) as f:
+            data = json.load(f)
+        self.version: Optional[str] = data.get("version")
+        self.payloads: List[dict] = data["payloads"]
+        if len(self.payloads) != len(self.embeddings):
+            raise ValueError(f"{directory}: embeddings and payloads are out of sync")
+
+        categories = np.array(
+            [p.get("procedure_code_category") or "" for p in self.payloads],
+            dtype=object,
+        )
+        self.category_masks: Dict[str, np.ndarray] = {
+            cat: categories == cat for cat in np.unique(categories)
+        }
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def mask_for(self, categories: List[str]) -> np.ndarray:
+        masks = [self.category_masks[c] for c in categories if c in self.category_masks]
+        if not masks:
+            return np.zeros(len(self), dtype=bool)
+        return np.logical_or.reduce(masks)
+
+    def search(
+        self, query_vector, top_k: int, categories: Optional[List[str]] = None
+    ) -> List[dict]:
+        """Cosine top-k, optionally restricted to `categories`."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.embeddings @ query
+
+        candidates = None
+        if categories:
+            candidates = np.flatnonzero(self.mask_for(categories))
+            scores = scores[candidates]
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        rows = candidates[top] if candidates is not None else top
+
+        return [
+            {
+                "cpt_code": self.payloads[row].get("cpt_code"),
+                "procedure_code_category": self.payloads[row].get(
+                    "procedure_code_category"
+                ),
+                "procedure_code_description": self.payloads[row].get(
+                    "procedure_code_description"
+                ),
+                "score": float(score),
+            }
+            for row, score in zip(rows.tolist(), scores[top].tolist())
+        ]
+
+
+_lock = threading.Lock()
+_index: Optional[LocalIndex] = None
+_payloads_mtime: Optional[float] = None
+
+
+def get_local_index() -> Optional[LocalIndex]:
+    """
+    The shared index, reloaded when a re-export replaces payloads.json (it is
+    renamed into place last); None if it has not been exported.
+    """
+    global _index, _payloads_mtime
+    try:
+        mtime = os.stat(os.path.join(LOCAL_INDEX_DIR, PAYLOADS_FILE)).st_mtime
+    except OSError:
+        return None
+    if _index is None or mtime != _payloads_mtime:
+        with _lock:
+            if _index is None or mtime != _payloads_mtime:
+                try:
+                    _index = LocalIndex()
+                except FileNotFoundError:
+                    return None
+                _payloads_mtime = mtime
+    return _index
+
+
+if __name__ == "__main__":
+    # Parity check: local top-k vs Cortex top-k for a handful of reasons.
+    from cortex_pool import run
+    from cpt_search import retrieve
+    from embedding_service import encode
+
+    index = get_local_index()
+    if index is None:
+        raise SystemExit(f"No local index in {LOCAL_INDEX_DIR}; run vector_stuff.py")
+    for reason in ["knee replacement", "chest pain", "appendicitis", "cataract"]:
+        vector = encode(reason).tolist()
+        local = index.search(vector, 10)
+        remote = run(retrieve(vector, 10, [], backend="cortex", fallback=False))
+        local_codes = [r["cpt_code"] for r in local]
+        remote_codes = [r["cpt_code"] for r in remote]
+        remote_scores = {r["cpt_code"]: r["score"] for r in remote}
+        shared = [r for r in local if r["cpt_code"] in remote_scores]
+        drift = max(
+            (abs(r["score"] - remote_scores[r["cpt_code"]]) for r in shared),
+            default=0.0,
+        )
+        overlap = len(set(local_codes) & set(remote_codes)) / max(len(remote_codes), 1)
+        print(f"{reason!r}: top-10 overlap {overlap:.0%}, max score drift {drift:.5f}")
@@ -0,0 +1,288 @@
+"""
+Groq cost estimation for CPT codes.
+
+Codes present in the precomputed pricing table (see build_pricing_table.py)
+are served from it; only missing codes are priced live.
+
+`get_cost_estimate_from_groq` prices one code. `get_cost_estimates_batch`
+prices a list of (cpt_code, description, category) tuples with one
+structured-output completion per chunk of PRICING_BATCH_SIZE codes, and falls
+back to per-item calls for any entry the batch reply does not cover or that
+fails validation. `iter_price_results` yields estimates in completion order
+for the streaming endpoints.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from groq import Groq
+from llm_cache import UnparsableCompletion, cached_completion
+from pricing_table import get_pricing_table
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import os
+
+GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+PRICING_CONCURRENCY = int(os.environ.get("PRICING_CONCURRENCY", "8"))
+PRICING_BATCH_SIZE = int(os.environ.get("PRICING_BATCH_SIZE", "10"))
+# "per_item": one completion per code. "batch": chunked multi-code completions.
+PRICING_MODES = ("per_item", "batch")
+DEFAULT_PRICING_MODE = os.environ.get("PRICING_MODE", "per_item")
+
+ESTIMATOR_INSTRUCTIONS = "You are a US healthcare billing estimator."
+
+
+class CostEstimate(BaseModel):
+    in_network: float
+    out_of_network: float
+    reasoning: str
+
+
+class CodeCostEstimate(CostEstimate):
+    cpt_code: str
+
+
+class CostEstimateBatch(BaseModel):
+    estimates: List[CodeCostEstimate]
+
+
+_groq_client: Optional[Groq] = None
+
+
+def get_client() -> Groq:
+    # Created on first use so GROQ_API_KEY from .env (load_dotenv) is seen.
+    global _groq_client
+    if _groq_client is None:
+        _groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+    return _groq_client
+
+
+# Shared across requests so PRICING_CONCURRENCY bounds in-flight Groq calls
+# for the whole process, not per request.
+_pricing_executor = ThreadPoolExecutor(
+    max_workers=PRICING_CONCURRENCY, thread_name_prefix="pricing"
+)
+
+
+def get_cost_estimate_from_groq(cpt_code: str, description: str, category: str) -> dict:
+    prompt = (
+        f"{ESTIMATOR_INSTRUCTIONS}\n\n"
+        f"CPT Code: {cpt_code}\n"
+        f"Procedure Description: {description}\n"
+        f"Category: {category}\n\n"
+        f"Provide realistic estimated costs in USD for in_network and out_of_network."
+    )
+    estimate = cached_completion(
+        "app_cost_estimate",
+        get_client(),
+        parse=CostEstimate.model_validate_json,
+        model=GROQ_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "cost_estimate",
+                "schema": CostEstimate.model_json_schema(),
+            },
+        },
+        temperature=0.3,
+    )
+    return estimate.model_dump()
+
+
+def lookup_precomputed(cpt_code: str) -> Optional[dict]:
+    table = get_pricing_table()
+    return table.lookup(cpt_code) if table is not None else None
+
+
+def price_one(item: Tuple[str, str, str], use_table: bool = True) -> dict:
+    """Price one (cpt_code, description, category); errors become {"error": ...}."""
+    precomputed = lookup_precomputed(item[0]) if use_table else None
+    if precomputed is not None:
+        return precomputed
+    try:
+        return get_cost_estimate_from_groq(*item)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _parse_batch(content: str, expected: Optional[set] = None) -> Dict[str, dict]:
+    """
+    Validate each entry on its own so one bad entry does not sink the chunk.
+    With `expected`, a reply missing any of those codes raises, so
+    cached_completion does not store a partial answer.
+    """
+    data = json.loads(content)
+    entries = data.get("estimates") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError("Batch reply has no 'estimates' list")
+    parsed = {}
+    for entry in entries:
+        try:
+            estimate = CodeCostEstimate.model_validate(entry)
+        except ValidationError:
+            continue
+        parsed[estimate.cpt_code.strip()] = estimate.model_dump(exclude={"cpt_code"})
+    if expected is not None and not expected <= parsed.keys():
+        raise ValueError(f"Batch reply is missing {len(expected - parsed.keys())} codes")
+    return parsed
+
+
+def _estimate_chunk(chunk: List[Tuple[str, str, str]]) -> Dict[str, dict]:
+    """
+    Estimates for the chunk's codes from one call. Codes missing from the
+    result, or the whole chunk when the call fails, fall back to price_one.
+    """
+    expected = {code for code, _, _ in chunk}
+    listing = "\n".join(
+        f"- CPT Code: {code} | Procedure Description: {description} | "
+        f"Category: {category}"
+        for code, description, category in chunk
+    )
+    prompt = (
+        f"{ESTIMATOR_INSTRUCTIONS}\n\n"
+        f"For every procedure below, provide realistic estimated costs in USD for "
+        f"in_network and out_of_network. Return exactly one estimate per CPT code, "
+        f"echoing the cpt_code.\n\n{listing}"
+    )
+    try:
+        return cached_completion(
+            "batch_cost_estimate",
+            get_client(),
+            parse=lambda content: _parse_batch(content, expected),
+            model=GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "cost_estimate_batch",
+                    "schema": CostEstimateBatch.model_json_schema(),
+                },
+            },
+            temperature=0.3,
+        )
+    except UnparsableCompletion as e:
+        # Keep whatever entries did parse, without caching the reply.
+        try:
+            return _parse_batch(e.content)
+        except Exception:
+            return {}
+    except Exception as e:
+        # API, network or rate-limit errors: every code gets priced alone.
+        print(f"Warning: batch pricing call failed: {e}")
+        return {}
+
+
+def _distinct(items: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+    return list({str(code): (str(code), d, c) for code, d, c in items}.values())
+
+
+def _iter_batch(
+    unique: List[Tuple[str, str, str]], use_table: bool = True
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (cpt_code, estimate) for distinct items as each one is priced."""
+    if use_table:
+        remaining = []
+        for item in unique:
+            precomputed = lookup_precomputed(item[0])
+            if precomputed is None:
+                remaining.append(item)
+            else:
+                yield item[0], precomputed
+        unique = remaining
+
+    wanted = {code for code, _, _ in unique}
+    covered = set()
+    chunk_futures = [
+        _pricing_executor.submit(_estimate_chunk, unique[i : i + PRICING_BATCH_SIZE])
+        for i in range(0, len(unique), PRICING_BATCH_SIZE)
+    ]
+    for future in as_completed(chunk_futures):
+        for code, estimate in future.result().items():
+            # Codes the model invented or repeated are ignored.
+            if code in wanted and code not in covered:
+                covered.add(code)
+                yield code, estimate
+
+    fallbacks = {
+        _pricing_executor.submit(price_one, item, use_table): item[0]
+        for item in unique
+        if item[0] not in covered
+    }
+    for future in as_completed(fallbacks):
+        yield fallbacks[future], future.result()
+
+
+def get_cost_estimates_batch(
+    items: List[Tuple[str, str, str]], use_table: bool = True
+) -> List[dict]:
+    """
+    Price (cpt_code, description, category) tuples, chunked into multi-code calls.
+
+    Returns one estimate dict per input item, in input order. Items the batch
+    reply missed are priced individually; an item that still fails gets
+    {"error": ...}. `use_table=False` skips the precomputed table (used when
+    rebuilding it).
+    """
+    unique = _distinct(items)
+    estimates = dict(_iter_batch(unique, use_table))
+    return [estimates[str(code)] for code, _, _ in items]
+
+
+def _result_items(cpt_results: List[dict]) -> List[Tuple[str, str, str]]:
+    return [
+        (
+            r["cpt_code"],
+            r["procedure_code_description"],
+            r["procedure_code_category"],
+        )
+        for r in cpt_results
+    ]
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in PRICING_MODES:
+        raise ValueError(
+            f"Unknown pricing mode {mode!r}; expected one of {PRICING_MODES}"
+        )
+
+
+def price_results(
+    cpt_results: List[dict], mode: str = DEFAULT_PRICING_MODE
+) -> List[dict]:
+    """Attach estimated_cost to search results, keeping their rank order."""
+    _check_mode(mode)
+    items = _result_items(cpt_results)
+    if mode == "batch":
+        estimates = get_cost_estimates_batch(items)
+    else:
+        # map() keeps the search rank order; failed items carry an error marker.
+        estimates = list(_pricing_executor.map(price_one, items))
+    return [{**r, "estimated_cost": e} for r, e in zip(cpt_results, estimates)]
+
+
+def iter_price_results(
+    cpt_results: List[dict], mode: str = DEFAULT_PRICING_MODE
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Yield (index into cpt_results, estimate) in completion order.
+
+    Used by the streaming endpoints: each estimate is sent as soon as its
+    Groq call (or table lookup) finishes instead of waiting for the slowest.
+    """
+    _check_mode(mode)
+    items = _result_items(cpt_results)
+    if mode == "batch":
+        positions: Dict[str, List[int]] = {}
+        for i, (code, _, _) in enumerate(items):
+            positions.setdefault(str(code), []).append(i)
+        unique = _distinct(items)
+        for code, estimate in _iter_batch(unique):
+            for i in positions[code]:
+                yield i, estimate
+    else:
+        futures = {
+            _pricing_executor.submit(price_one, item): i
+            for i, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,104 @@
+"""
+Precomputed CPT pricing table.
+
+build_pricing_table.py prices every code in the workbook offline and writes
+PRICING_TABLE_DIR as one .npy column per field plus manifest.json. At serve
+time the columns are memory-mapped and a code -> row dict gives O(1) lookups.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+import numpy as np
+
+PRICING_TABLE_DIR = os.environ.get(
+    "PRICING_TABLE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "pricing_table"),
+)
+MANIFEST_FILE = "manifest.json"
+COLUMNS = ("cpt_code", "in_network", "out_of_network", "reasoning")
+
+
+def write_table(
+    rows: List[dict], version: str, directory: str = PRICING_TABLE_DIR
+) -> None:
+    """Write priced rows (dicts with COLUMNS keys) as a versioned column set."""
+    rows = sorted(rows, key=lambda r: str(r["cpt_code"]))
+    columns = {
+        "cpt_code": np.array([str(r["cpt_code"]) for r in rows], dtype=str),
+        # float64 so dollar amounts round-trip exactly as the LLM returned them.
+        "in_network": np.array([r["in_network"] for r in rows], dtype=np.float64),
+        "out_of_network": np.array(
+            [r["out_of_network"] for r in rows], dtype=np.float64
+        ),
+        "reasoning": np.array([r.get("reasoning", "") for r in rows], dtype=str),
+    }
+    os.makedirs(directory, exist_ok=True)
+    # Columns are written first and the manifest last, so a reader never sees
+    # a manifest pointing at half-written columns.
+    for name, values in columns.items():
+        tmp_path = os.path.join(directory, f".{name}.npy.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, values)
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+    manifest = {
+        "version": version,
+        "rows": len(rows),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_path = os.path.join(directory, f".{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+
+class PricingTable:
+    def __init__(self, directory: str = PRICING_TABLE_DIR):
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+        self._rows: Dict[str, int] = {
+            code: i for i, code in enumerate(self.columns["cpt_code"].tolist())
+        }
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.manifest.get("version")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, cpt_code: str) -> bool:
+        return str(cpt_code) in self._rows
+
+    def lookup(self, cpt_code: str) -> Optional[dict]:
+        row = self._rows.get(str(cpt_code))
+        if row is None:
+            return None
+        return {
+            "in_network": float(self.columns["in_network"][row]),
+            "out_of_network": float(self.columns["out_of_network"][row]),
+            "reasoning": str(self.columns["reasoning"][row]),
+        }
+
+
+_lock = threading.Lock()
+_table: Optional[PricingTable] = None
+
+
+def get_pricing_table() -> Optional[PricingTable]:
+    """Load the table once; returns None if it has not been built."""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                try:
+                    _table = PricingTable()
+                except FileNotFoundError:
+                    return None
+    return _table
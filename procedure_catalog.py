@@ -0,0 +1,164 @@
+"""
+In-process cache of the procedure_index collection.
+
+The 39-row procedure_index only changes when vector_stuff.py re-ingests, so it
+is scrolled once and then served from memory. Ingestion stamps every payload
+with a `catalog_version` and writes the same stamp to CATALOG_MANIFEST; a
+mismatch between the two (or the TTL expiring) triggers a reload.
+"""
+
+from cortex import AsyncCortexClient
+from cortex_pool import get_pool, run
+from local_index import load_procedure_index
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
+import json
+import os
+import time
+
+COLLECTION_PROC = "procedure_index"
+CATALOG_MANIFEST = os.environ.get(
+    "CATALOG_MANIFEST",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_manifest.json"),
+)
+# 0 disables the TTL; the catalog is then only reloaded on a version change.
+CATALOG_TTL_SECONDS = float(os.environ.get("CATALOG_TTL_SECONDS", "3600"))
+VERSION_FIELD = "catalog_version"
+
+
+def read_manifest_version(path: str = CATALOG_MANIFEST) -> Optional[str]:
+    """Return the procedure_index version last written by ingestion, if any."""
+    try:
+        with open(path) as f:
+            return json.load(f).get(COLLECTION_PROC, {}).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest_version(version: str, rows: int, path: str = CATALOG_MANIFEST) -> None:
+    """Record a freshly ingested procedure_index version (called by vector_stuff)."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest[COLLECTION_PROC] = {
+        "version": version,
+        "rows": rows,
+        "ingested_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ProcedureCatalog:
+    def __init__(self, ttl_seconds: float = CATALOG_TTL_SECONDS, manifest_path: str = CATALOG_MANIFEST):
+        self.ttl_seconds = ttl_seconds
+        self.manifest_path = manifest_path
+        self._entries: Optional[List[dict]] = None
+        self._version: Optional[str] = None
+        self._loaded_at = 0.0
+        self._manifest_mtime: Optional[float] = None
+        self._manifest_version: Optional[str] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+        self._loads = 0
+        self._hits = 0
+
+    def _current_manifest_version(self) -> Optional[str]:
+        # Only re-read the manifest when its mtime changes; a stat is cheap.
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            self._manifest_mtime = None
+            self._manifest_version = None
+            return None
+        if mtime != self._manifest_mtime:
+            self._manifest_mtime = mtime
+            self._manifest_version = read_manifest_version(self.manifest_path)
+        return self._manifest_version
+
+    def is_stale(self) -> bool:
+        if self._entries is None:
+            return True
+        if self.ttl_seconds and time.monotonic() - self._loaded_at >= self.ttl_seconds:
+            return True
+        manifest_version = self._current_manifest_version()
+        return manifest_version is not None and manifest_version != self._version
+
+    async def _scroll(self, client: AsyncCortexClient) -> List[dict]:
+        records, _ = await client.scroll(COLLECTION_PROC, limit=100, with_vectors=False)
+        return [r.payload for r in records if r.payload]
+
+    async def refresh(self) -> List[dict]:
+        """Reload procedure_index from Cortex, regardless of staleness.
+
+        If Cortex is unreachable, keep serving the entries already in memory,
+        or load the snapshot exported next to the local CPT index.
+        """
+        try:
+            payloads = await get_pool().call(self._scroll)
+        except Exception as e:
+            if self._entries is not None:
+                self._loaded_at = time.monotonic()
+                return self._entries
+            try:
+                payloads = load_procedure_index()
+            except (OSError, ValueError):
+                raise e
+        versions = {p.get(VERSION_FIELD) for p in payloads}
+        self._version = versions.pop() if len(versions) == 1 else None
+        self._entries = [
+            {k: v for k, v in p.items() if k != VERSION_FIELD} for p in payloads
+        ]
+        self._loaded_at = time.monotonic()
+        self._loads += 1
+        return self._entries
+
+    async def get_entries(self) -> List[dict]:
+        """Return the cached entries, reloading first if they are stale."""
+        if not self.is_stale():
+            self._hits += 1
+            return self._entries
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            # Another request may have reloaded while we waited for the lock.
+            if self.is_stale():
+                return await self.refresh()
+            self._hits += 1
+            return self._entries
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._entries is not None,
+            "rows": len(self._entries or []),
+            "version": self._version,
+            "manifest_version": self._current_manifest_version(),
+            "stale": self.is_stale(),
+            "age_seconds": (
+                round(time.monotonic() - self._loaded_at, 1)
+                if self._entries is not None
+                else None
+            ),
+            "ttl_seconds": self.ttl_seconds,
+            "loads": self._loads,
+            "hits": self._hits,
+        }
+
+
+_catalog = ProcedureCatalog()
+
+
+def get_catalog() -> ProcedureCatalog:
+    return _catalog
+
+
+def load_catalog() -> List[dict]:
+    """Synchronously (re)load the catalog, e.g. at startup or from an admin endpoint."""
+    return run(_catalog.refresh())
@@ -0,0 +1,364 @@
+"""
+Ranking of bill-payment options for /rank-options and /rank-options/batch.
+
+`rank_scenario` is the single-request path: it builds the option list for
+one patient, scores it and returns the top RANKED_OPTIONS. `rank_batch` does
+the same for many scenarios at once. It builds an (n, 6) matrix per field
+(charity, appeal, negotiation, payment plan, HSA, loan), scores every
+scenario in one vectorized pass, and uses a stable argsort, so ties break in
+the same order as `sorted`. Both paths use the same float64 operations in the
+same order and give identical results; bench_rank.py checks that.
+`rank_columns` is the array core, also used by cohort_sim.py.
+"""
+
+from typing import List
+import os
+import numpy as np
+
+RANKED_OPTIONS = 4
+RANK_BATCH_MAX_SCENARIOS = int(os.environ.get("RANK_BATCH_MAX_SCENARIOS", "10000"))
+
+# Column order of the option matrix = the order options are appended in the
+# single-request path. Full and Partial Charity Care share column 0.
+OPTION_NAMES = [
+    "Charity Care",
+    "Insurance Appeal for Out-of-Network Coverage",
+    "Direct Bill Negotiation",
+    "Hospital Interest-Free Payment Plan",
+    "Use HSA Funds",
+    "Medical Loan Financing",
+]
+FULL_CHARITY = "Full Charity Care"
+PARTIAL_CHARITY = "Partial Charity Care"
+# Output name per column, plus an extra slot for Full Charity Care.
+FULL_CHARITY_KIND = len(OPTION_NAMES)
+KIND_NAMES = [PARTIAL_CHARITY] + OPTION_NAMES[1:] + [FULL_CHARITY]
+# Risk score per option, shared by both ranking paths; rank_montecarlo uses
+# 1 - risk as the default approval rate of the uncertain ones.
+OPTION_RISKS = {
+    FULL_CHARITY: 0.1,
+    PARTIAL_CHARITY: 0.2,
+    OPTION_NAMES[1]: 0.3,
+    OPTION_NAMES[2]: 0.25,
+    OPTION_NAMES[3]: 0.05,
+    OPTION_NAMES[4]: 0.01,
+    OPTION_NAMES[5]: 0.5,
+}
+
+
+def _number(data: dict, key: str, default):
+    value = data.get(key, default)
+    if not isinstance(value, (int, float)):
+        raise ValueError(f"{key} must be a number")
+    return value
+
+
+def parse_scenario(data: dict) -> dict:
+    """Validated inputs of one /rank-options body; ValueError -> 400."""
+    if not isinstance(data, dict):
+        raise ValueError("each scenario must be an object")
+    try:
+        oop = float(data.get("estimated_oop", 0))
+    except (TypeError, ValueError):
+        raise ValueError("estimated_oop must be a number")
+    if oop <= 0:
+        raise ValueError("estimated_oop must be greater than 0")
+
+    try:
+        income_percent_fpl = float(data.get("income_percent_fpl", 0))
+    except (TypeError, ValueError):
+        raise ValueError("income_percent_fpl must be a number")
+
+    insurance_type = data.get("insurance_type", "PPO")  # PPO, HDHP, Medicaid, Uninsured
+    hospital_policy = data.get("hospital_charity_policy", {})
+    if not hospital_policy:
+        raise ValueError("hospital_charity_policy is required")
+    if not isinstance(hospital_policy, dict):
+        raise ValueError("hospital_charity_policy must be an object")
+
+    payment_plan_months = _number(data, "hospital_payment_plan_months", 12)
+    loan_term = _number(data, "loan_term_months", 24)
+    if payment_plan_months <= 0 or loan_term <= 0:
+        raise ValueError("hospital_payment_plan_months and loan_term_months must be positive")
+
+    return {
+        "oop": oop,
+        "income_percent_fpl": income_percent_fpl,
+        "insurance_type": insurance_type,
+        "in_network": bool(data.get("in_network", True)),
+        "free_care_threshold": _number(hospital_policy, "free_care_threshold", 100),
+        "discount_threshold": _number(hospital_policy, "discount_threshold", 300),
+        "discount_percent": _number(hospital_policy, "discount_percent", 0),
+        "negotiation_rate": _number(data, "negotiation_success_rate", 0.2),
+        "payment_plan_months": payment_plan_months,
+        "loan_apr": _number(data, "loan_apr", 0.15),
+        "loan_term": loan_term,
+        "has_hsa": insurance_type == "HDHP" and _number(data, "hsa_balance", 0) > 0,
+    }
+
+
+def rank_scenario(data: dict) -> List[dict]:
+    """Top RANKED_OPTIONS options for one /rank-options body, cheapest first."""
+    s = parse_scenario(data)
+    oop = s["oop"]
+    payment_plan_months = s["payment_plan_months"]
+
+    options = []
+
+    # ----------------------------
+    # 1 Charity Care (Income-based)
+    # ----------------------------
+    if s["income_percent_fpl"] <= s["free_care_threshold"]:
+        options.append(
+            {
+                "name": FULL_CHARITY,
+                "total_cost": 0,
+                "monthly_payment": 0,
+                "risk": OPTION_RISKS[FULL_CHARITY],
+            }
+        )
+
+    elif s["income_percent_fpl"] <= s["discount_threshold"]:
+        discounted = oop * (1 - s["discount_percent"])
+        options.append(
+            {
+                "name": PARTIAL_CHARITY,
+                "total_cost": discounted,
+                "monthly_payment": discounted / payment_plan_months,
+                "risk": OPTION_RISKS[PARTIAL_CHARITY],
+            }
+        )
+
+    # ----------------------------
+    # 2 Insurance Appeal (OON scenario)
+    # ----------------------------
+    if not s["in_network"] and s["insurance_type"] not in ["Medicaid"]:
+        options.append(
+            {
+                "name": OPTION_NAMES[1],
+                "total_cost": oop * 0.8,
+                "monthly_payment": (oop * 0.8) / 12,
+                "risk": OPTION_RISKS[OPTION_NAMES[1]],
+            }
+        )
+
+    # ----------------------------
+    # 3 Bill Negotiation
+    # ----------------------------
+    negotiated_cost = oop * (1 - s["negotiation_rate"])
+    options.append(
+        {
+            "name": OPTION_NAMES[2],
+            "total_cost": negotiated_cost,
+            "monthly_payment": negotiated_cost / 12,
+            "risk": OPTION_RISKS[OPTION_NAMES[2]],
+        }
+    )
+
+    # ----------------------------
+    # 4 Hospital Payment Plan
+    # ----------------------------
+    options.append(
+        {
+            "name": OPTION_NAMES[3],
+            "total_cost": oop,
+            "monthly_payment": oop / payment_plan_months,
+            "risk": OPTION_RISKS[OPTION_NAMES[3]],
+        }
+    )
+
+    # ----------------------------
+    # 5 HSA/FSA (if HDHP)
+    # ----------------------------
+    if s["has_hsa"]:
+        options.append(
+            {
+                "name": OPTION_NAMES[4],
+                "total_cost": oop,
+                "monthly_payment": 0,
+                "risk": OPTION_RISKS[OPTION_NAMES[4]],
+            }
+        )
+
+    # ----------------------------
+    # 6 Medical Loan (last resort)
+    # ----------------------------
+    total_with_interest = oop * (1 + s["loan_apr"])
+    options.append(
+        {
+            "name": OPTION_NAMES[5],
+            "total_cost": total_with_interest,
+            "monthly_payment": total_with_interest / s["loan_term"],
+            "risk": OPTION_RISKS[OPTION_NAMES[5]],
+        }
+    )
+
+    # ----------------------------
+    # Scoring
+    # ----------------------------
+    max_cost = max(o["total_cost"] for o in options)
+    if max_cost == 0:
+        max_cost = 1
+
+    for o in options:
+        normalized_cost = o["total_cost"] / max_cost
+        normalized_monthly = (o["monthly_payment"] / oop) if oop > 0 else 0
+
+        o["score"] = 0.5 * normalized_cost + 0.3 * normalized_monthly + 0.2 * o["risk"]
+
+    ranked = sorted(options, key=lambda x: x["score"])
+
+    for r in ranked:
+        r.pop("score")
+
+    return ranked[:RANKED_OPTIONS]
+
+
+# Per-scenario inputs of `rank_columns`, one array each.
+SCENARIO_COLUMNS = [
+    "oop",
+    "income_percent_fpl",
+    "medicaid",
+    "in_network",
+    "free_care_threshold",
+    "discount_threshold",
+    "discount_percent",
+    "negotiation_rate",
+    "payment_plan_months",
+    "loan_apr",
+    "loan_term",
+    "has_hsa",
+]
+
+
+def rank_columns(c: dict) -> dict:
+    """
+    Vectorized ranking over SCENARIO_COLUMNS arrays.
+
+    Returns (n, RANKED_OPTIONS) arrays, best first: `kind` (index into
+    KIND_NAMES), `present` (False past the last available option), and the
+    `total_cost`, `monthly_payment` and `risk` of each ranked option.
+    """
+    oop = np.asarray(c["oop"], dtype=np.float64)
+    ipf = np.asarray(c["income_percent_fpl"], dtype=np.float64)
+    plan_months = np.asarray(c["payment_plan_months"], dtype=np.float64)
+
+    n = len(oop)
+    total = np.empty((n, len(OPTION_NAMES)))
+    monthly = np.empty((n, len(OPTION_NAMES)))
+    risk = np.empty((n, len(OPTION_NAMES)))
+    present = np.ones((n, len(OPTION_NAMES)), dtype=bool)
+
+    # 1 Charity Care
+    full = ipf <= c["free_care_threshold"]
+    partial = ~full & (ipf <= c["discount_threshold"])
+    discounted = oop * (1 - np.asarray(c["discount_percent"], dtype=np.float64))
+    total[:, 0] = np.where(full, 0.0, discounted)
+    monthly[:, 0] = np.where(full, 0.0, discounted / plan_months)
+    risk[:, 0] = np.where(
+        full, OPTION_RISKS[FULL_CHARITY], OPTION_RISKS[PARTIAL_CHARITY]
+    )
+    present[:, 0] = full | partial
+
+    # 2 Insurance Appeal
+    total[:, 1] = oop * 0.8
+    monthly[:, 1] = (oop * 0.8) / 12
+    risk[:, 1] = OPTION_RISKS[OPTION_NAMES[1]]
+    present[:, 1] = ~np.asarray(c["in_network"], dtype=bool) & ~np.asarray(
+        c["medicaid"], dtype=bool
+    )
+
+    # 3 Bill Negotiation
+    negotiated = oop * (1 - np.asarray(c["negotiation_rate"], dtype=np.float64))
+    total[:, 2] = negotiated
+    monthly[:, 2] = negotiated / 12
+    risk[:, 2] = OPTION_RISKS[OPTION_NAMES[2]]
+
+    # 4 Hospital Payment Plan
+    total[:, 3] = oop
+    monthly[:, 3] = oop / plan_months
+    risk[:, 3] = OPTION_RISKS[OPTION_NAMES[3]]
+
+    # 5 HSA/FSA
+    total[:, 4] = oop
+    monthly[:, 4] = 0.0
+    risk[:, 4] = OPTION_RISKS[OPTION_NAMES[4]]
+    present[:, 4] = np.asarray(c["has_hsa"], dtype=bool)
+
+    # 6 Medical Loan
+    with_interest = oop * (1 + np.asarray(c["loan_apr"], dtype=np.float64))
+    total[:, 5] = with_interest
+    monthly[:, 5] = with_interest / np.asarray(c["loan_term"], dtype=np.float64)
+    risk[:, 5] = OPTION_RISKS[OPTION_NAMES[5]]
+
+    # Scoring: same expression and evaluation order as rank_scenario.
+    max_cost = np.where(present, total, -np.inf).max(axis=1)
+    max_cost[max_cost == 0] = 1
+    score = (
+        0.5 * (total / max_cost[:, None])
+        + 0.3 * (monthly / oop[:, None])
+        + 0.2 * risk
+    )
+    score[~present] = np.inf
+    order = np.argsort(score, axis=1, kind="stable")[:, :RANKED_OPTIONS]
+
+    return {
+        "kind": np.where((order == 0) & full[:, None], FULL_CHARITY_KIND, order),
+        "present": np.take_along_axis(present, order, axis=1),
+        "total_cost": np.take_along_axis(total, order, axis=1),
+        "monthly_payment": np.take_along_axis(monthly, order, axis=1),
+        "risk": np.take_along_axis(risk, order, axis=1),
+    }
+
+
+def rank_batch(scenarios: list) -> List[dict]:
+    """
+    One {"ranked_options": [...]} per scenario, or {"error": ...} for a
+    scenario `rank_scenario` would reject with a 400.
+    """
+    results: List[dict] = [{} for _ in scenarios]
+    parsed = []
+    rows = []
+    for i, data in enumerate(scenarios):
+        try:
+            parsed.append(parse_scenario(data))
+            rows.append(i)
+        except (TypeError, ValueError) as e:
+            results[i] = {"error": str(e)}
+    if not parsed:
+        return results
+
+    columns = {
+        key: np.array([s[key] for s in parsed])
+        for key in SCENARIO_COLUMNS
+        if key != "medicaid"
+    }
+    columns["medicaid"] = np.array([s["insurance_type"] == "Medicaid" for s in parsed])
+    ranked = rank_columns(columns)
+
+    # Only the top RANKED_OPTIONS cells are turned back into Python objects.
+    kind = ranked["kind"]
+    top_present = ranked["present"].tolist()
+    top_total = ranked["total_cost"].astype(object)
+    top_monthly = ranked["monthly_payment"].astype(object)
+    # Constant zeros are ints in the single-request response.
+    top_total[kind == FULL_CHARITY_KIND] = 0
+    top_monthly[(kind == FULL_CHARITY_KIND) | (kind == 4)] = 0
+    top_risk = ranked["risk"].tolist()
+    rows_out = zip(
+        rows, kind.tolist(), top_present, top_total.tolist(), top_monthly.tolist(), top_risk
+    )
+    for i, kinds, present_row, totals, monthlies, risks in rows_out:
+        results[i] = {
+            "ranked_options": [
+                {
+                    "name": KIND_NAMES[k],
+                    "total_cost": t,
+                    "monthly_payment": m,
+                    "risk": r,
+                }
+                for k, p, t, m, r in zip(kinds, present_row, totals, monthlies, risks)
+                if p
+            ]
+        }
+    return results
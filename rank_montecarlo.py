@@ -0,0 +1,179 @@
+"""
+Monte Carlo cost outcomes for /rank-options ("probabilistic": true).
+
+The deterministic ranking (rank_engine) treats every option's cost as
+certain. Here the uncertain ones are sampled instead:
+  - charity care is approved with probability charity_approval_rate
+    (default 1 - the option's risk); a denial means paying estimated_oop
+  - an out-of-network appeal is approved with probability
+    appeal_approval_rate (default 1 - risk); a denial means paying
+    estimated_oop
+  - the negotiated reduction is drawn from a Beta distribution whose mean is
+    negotiation_success_rate, so the expected cost equals the deterministic
+    one
+The payment plan, HSA and loan costs are fixed. Risks come from
+rank_engine.OPTION_RISKS, the values the deterministic ranking scores with.
+
+Samples are drawn in blocks with a seeded RNG. The work per request is
+capped at MONTE_CARLO_BUDGET_DRAWS (options x samples), roughly 3 ms on one
+core, rather than by wall-clock time, so the same request and seed always
+get the same answer; the response says how many samples were used.
+"""
+
+from rank_engine import (
+    FULL_CHARITY,
+    OPTION_NAMES,
+    OPTION_RISKS,
+    PARTIAL_CHARITY,
+    parse_scenario,
+)
+from typing import Callable, List, Optional, Tuple
+import os
+import time
+import numpy as np
+
+MONTE_CARLO_SAMPLES = int(os.environ.get("MONTE_CARLO_SAMPLES", "4000"))
+MONTE_CARLO_MAX_SAMPLES = int(os.environ.get("MONTE_CARLO_MAX_SAMPLES", "20000"))
+MONTE_CARLO_BUDGET_DRAWS = int(os.environ.get("MONTE_CARLO_BUDGET_DRAWS", "64000"))
+MONTE_CARLO_BLOCK = 1000
+# Beta(mean * k, (1 - mean) * k): higher k means less spread around the mean.
+NEGOTIATION_CONCENTRATION = float(
+    os.environ.get("MONTE_CARLO_NEGOTIATION_CONCENTRATION", "10")
+)
+
+Sampler = Callable[[np.random.Generator, int], np.ndarray]
+
+
+def _rate(data: dict, key: str, default: float) -> float:
+    value = data.get(key, default)
+    if not isinstance(value, (int, float)) or not 0 <= value <= 1:
+        raise ValueError(f"{key} must be a number between 0 and 1")
+    return float(value)
+
+
+def _approved(cost: float, fallback: float, p: float) -> Sampler:
+    return lambda rng, n: np.where(rng.random(n) < p, cost, fallback)
+
+
+def _negotiated(oop: float, mean_reduction: float) -> Sampler:
+    if not 0 < mean_reduction < 1:
+        # Degenerate Beta: the reduction is certain.
+        return lambda rng, n: np.full(n, oop * (1 - mean_reduction))
+    a = mean_reduction * NEGOTIATION_CONCENTRATION
+    b = (1 - mean_reduction) * NEGOTIATION_CONCENTRATION
+    return lambda rng, n: oop * (1 - rng.beta(a, b, n))
+
+
+def _fixed(cost: float) -> Sampler:
+    return lambda rng, n: np.full(n, cost)
+
+
+def option_samplers(data: dict) -> List[Tuple[str, Sampler]]:
+    """(name, sampler) for every option the deterministic path would offer."""
+    s = parse_scenario(data)
+    oop = s["oop"]
+    options = []
+
+    if s["income_percent_fpl"] <= s["free_care_threshold"]:
+        p = _rate(data, "charity_approval_rate", 1 - OPTION_RISKS[FULL_CHARITY])
+        options.append((FULL_CHARITY, _approved(0.0, oop, p)))
+    elif s["income_percent_fpl"] <= s["discount_threshold"]:
+        p = _rate(data, "charity_approval_rate", 1 - OPTION_RISKS[PARTIAL_CHARITY])
+        discounted = oop * (1 - s["discount_percent"])
+        options.append((PARTIAL_CHARITY, _approved(discounted, oop, p)))
+
+    if not s["in_network"] and s["insurance_type"] not in ["Medicaid"]:
+        p = _rate(data, "appeal_approval_rate", 1 - OPTION_RISKS[OPTION_NAMES[1]])
+        options.append((OPTION_NAMES[1], _approved(oop * 0.8, oop, p)))
+
+    options.append((OPTION_NAMES[2], _negotiated(oop, s["negotiation_rate"])))
+    options.append((OPTION_NAMES[3], _fixed(oop)))
+    if s["has_hsa"]:
+        options.append((OPTION_NAMES[4], _fixed(oop)))
+    options.append((OPTION_NAMES[5], _fixed(oop * (1 + s["loan_apr"]))))
+    return options
+
+
+def simulate_options(
+    data: dict,
+    samples: Optional[int] = None,
+    seed: Optional[int] = None,
+    budget_draws: int = MONTE_CARLO_BUDGET_DRAWS,
+) -> dict:
+    """
+    Expected cost, P10/P90 and probability of being cheapest for every
+    option, cheapest expected cost first.
+    """
+    if samples is None:
+        samples = MONTE_CARLO_SAMPLES
+    if isinstance(samples, bool) or not isinstance(samples, int):
+        raise ValueError("samples must be an integer")
+    if not 1 <= samples <= MONTE_CARLO_MAX_SAMPLES:
+        raise ValueError(f"samples must be between 1 and {MONTE_CARLO_MAX_SAMPLES}")
+    if seed is None:
+        seed = 0
+    if isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+        raise ValueError("seed must be a non-negative integer")
+
+    started = time.perf_counter()
+    options = option_samplers(data)
+    rng = np.random.default_rng(seed)
+    target = min(samples, max(1, budget_draws // len(options)))
+    blocks = []
+    drawn = 0
+    while drawn < target:
+        n = min(MONTE_CARLO_BLOCK, target - drawn)
+        # (options, samples): reductions across options run over whole rows.
+        blocks.append(np.vstack([sample(rng, n) for _, sample in options]))
+        drawn += n
+    costs = np.hstack(blocks)
+
+    # Ties (e.g. payment plan vs HSA, both estimated_oop) split the win.
+    cheapest = costs == costs.min(axis=0)
+    p_cheapest = (cheapest / cheapest.sum(axis=0)).mean(axis=1)
+    expected = costs.mean(axis=1)
+    p10, p90 = np.percentile(costs, [10, 90], axis=1)
+
+    outcomes = [
+        {
+            "name": name,
+            "expected_cost": round(float(expected[i]), 2),
+            "p10_cost": round(float(p10[i]), 2),
+            "p90_cost": round(float(p90[i]), 2),
+            "probability_cheapest": round(float(p_cheapest[i]), 4),
+        }
+        for i, (name, _) in enumerate(options)
+    ]
+    outcomes.sort(key=lambda o: o["expected_cost"])
+    return {
+        "outcomes": outcomes,
+        "simulation": {
+            "samples": drawn,
+            "requested_samples": samples,
+            "seed": seed,
+            "truncated": drawn < samples,
+            "budget_draws": budget_draws,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+        },
+    }
+
+
+if __name__ == "__main__":
+    # Per-patient latency over a seeded caseload (see bench_rank.py).
+    from bench_rank import make_scenarios
+
+    scenarios = [s for s in make_scenarios(1000, seed=0) if s.get("estimated_oop")]
+    simulate_options(scenarios[0])  # first call imports/initialises NumPy paths
+    latencies, truncated = [], 0
+    for i, scenario in enumerate(scenarios):
+        result = simulate_options(scenario, seed=i)
+        latencies.append(result["simulation"]["ms"])
+        truncated += result["simulation"]["truncated"]
+    latencies.sort()
+    print(
+        f"{len(scenarios)} patients x {MONTE_CARLO_SAMPLES} samples: "
+        f"p50 {latencies[len(latencies) // 2]:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms, "
+        f"max {latencies[-1]:.2f} ms (budget {MONTE_CARLO_BUDGET_DRAWS} draws, "
+        f"{truncated} truncated)"
+    )
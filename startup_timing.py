@@ -0,0 +1,49 @@
+"""
+Wall-clock timings for process startup, served at GET /api/startup.
+
+app.py imports this module first and wraps each import group in `phase`;
+embedding_service records the model load the same way, whenever it happens.
+"""
+
+from contextlib import contextmanager
+from typing import List
+import os
+import threading
+import time
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+_phases: List[dict] = []
+_ready_ms = None
+
+
+def record(name: str, seconds: float) -> None:
+    with _lock:
+        _phases.append(
+            {"phase": name, "ms": round(seconds * 1000, 2), "pid": os.getpid()}
+        )
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def mark_ready() -> None:
+    """Note when the app module finished importing (it can serve /health)."""
+    global _ready_ms
+    _ready_ms = round((time.perf_counter() - _started) * 1000, 2)
+
+
+def startup_report() -> dict:
+    with _lock:
+        phases = list(_phases)
+    return {
+        "pid": os.getpid(),
+        "import_to_ready_ms": _ready_ms,
+        "phases": phases,
+    }
@@ -1,96 +1,491 @@
+"""
+Ingest the CPT workbook into Cortex (cpt_codes + procedure_index).
+
+Ingestion is incremental: every row is hashed (payload + embedding model), and
+only new or changed rows are embedded and upserted. Codes that disappeared
+from the workbook are deleted.
+Point IDs are derived from the CPT code (procedure category for
+procedure_index), so they stay stable across releases. The row hashes live
+in LOCAL_INDEX_DIR/ingest_state.json and vectors of unchanged rows are reused
+from the local index export.
+
+Embedding and upserting run as a pipeline (see upsert_pipelined): batches are
+embedded in a worker thread while INGEST_UPSERT_WORKERS tasks upsert earlier
+chunks, joined by a bounded queue. Every upserted chunk is journaled, so an
+interrupted run resumes instead of starting over.
+
+Usage:
+    python vector_stuff.py          # incremental
+    python vector_stuff.py --full   # drop both collections and rebuild
+    python vector_stuff.py --embed-batch 512 --upsert-chunk 128 --workers 8
+"""
+
 from cortex import AsyncCortexClient, DistanceMetric
-from sentence_transformers import SentenceTransformer
+from data_cache import CPT_WORKBOOK, load_frame
+from embedding_service import get_model, model_id
+from local_index import LOCAL_INDEX_DIR, LocalIndex, export_index, export_procedure_index
+from procedure_catalog import VERSION_FIELD, read_manifest_version, write_manifest_version
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import argparse
 import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
 import pandas as pd
 
-# Load the Excel file and read the "All 2026 CPT Codes" sheet
-df = pd.read_excel("cpt-pcm-nhsn.xlsx")
-# Remove the Code Status column
-df = df.drop(columns=["Code Status"])
+# Rows per model.encode call, rows per batch_upsert, concurrent upserts, and
+# how many upsert chunks may wait between the two stages.
+INGEST_EMBED_BATCH = int(os.environ.get("INGEST_EMBED_BATCH", "256"))
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "128"))
+INGEST_UPSERT_WORKERS = int(os.environ.get("INGEST_UPSERT_WORKERS", "4"))
+INGEST_QUEUE_DEPTH = int(os.environ.get("INGEST_QUEUE_DEPTH", "8"))
+INGEST_STATE_FILE = os.path.join(LOCAL_INDEX_DIR, "ingest_state.json")
+INGEST_JOURNAL_DIR = os.path.join(LOCAL_INDEX_DIR, "ingest_journal")
 
-index_df = pd.read_excel("cpt-pcm-nhsn.xlsx", sheet_name=1, engine="openpyxl")
-print(f"Rows loaded: {len(index_df)}")
-print(f"Columns: {list(index_df.columns)}")
-
-# Load embedding model (384 dimensions)
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-print(
-    f"Embedding model loaded — dimension: {embed_model.get_sentence_embedding_dimension()}"
-)
-
-# ── Collection 1: cpt_codes (Sheet 0 — 1,164 rows) ──────────────────────────
 COLLECTION_CPT = "cpt_codes"
 COLLECTION_PROC = "procedure_index"
 DIMENSION = 384
 
 
-async def main():
-    async with AsyncCortexClient("localhost:50051") as client:
-        # Create collection (idempotent — safe to re-run)
-        await client.get_or_create_collection(
-            COLLECTION_CPT, dimension=DIMENSION, distance_metric=DistanceMetric.COSINE
+def stable_id(key: str) -> int:
+    """Point ID for a CPT code / category: the same key always maps to the same ID."""
+    # 63 bits so the ID fits a signed 64-bit integer.
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big") >> 1
+
+
+def row_hash(payload: dict) -> str:
+    # The model (and backend) is part of the hash, so switching either
+    # re-embeds everything.
+    canonical = json.dumps(payload, sort_keys=True, default=str) + model_id()
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def load_workbook(path: str = CPT_WORKBOOK):
+    """Both sheets, from the columnar cache (see data_cache.py)."""
+    return load_frame(path, sheet=0), load_frame(path, sheet=1)
+
+
+def cpt_payloads(df: pd.DataFrame) -> Dict[str, dict]:
+    """Sheet 0 -> {cpt_code: payload}, in workbook order."""
+    df = df.drop(columns=["Code Status"], errors="ignore")
+    df["Procedure Code Descriptions"] = df["Procedure Code Descriptions"].fillna("")
+    df["CPT Codes"] = df["CPT Codes"].astype(str)
+    payloads: Dict[str, dict] = {}
+    for category, code, description in zip(
+        df["Procedure Code Category"],
+        df["CPT Codes"],
+        df["Procedure Code Descriptions"],
+    ):
+        if code in payloads:
+            print(f"Duplicate CPT code {code}; keeping the last row")
+        payloads[code] = {
+            "procedure_code_category": category,
+            "cpt_code": code,
+            "procedure_code_description": description,
+        }
+    return payloads
+
+
+def procedure_payloads(index_df: pd.DataFrame) -> Dict[str, dict]:
+    """Sheet 1 -> {procedure_code_category: payload}, in workbook order."""
+    # Normalize the double-space column name from the Excel sheet
+    index_df.columns = [c.strip().replace("  ", " ") for c in index_df.columns]
+    index_df["Procedure Description"] = index_df["Procedure Description"].fillna("")
+    return {
+        str(category): {
+            "procedure_code_category": category,
+            "operative_procedure": operative,
+            "procedure_description": description,
+        }
+        for category, operative, description in zip(
+            index_df["Procedure Code Category"],
+            index_df["Operative Procedure"],
+            index_df["Procedure Description"],
+        )
+    }
+
+
+def load_state(path: str = INGEST_STATE_FILE) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state: dict, path: str = INGEST_STATE_FILE) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def previous_vectors() -> Dict[str, np.ndarray]:
+    """Vectors from the last local index export, keyed by CPT code."""
+    try:
+        index = LocalIndex()
+    except (FileNotFoundError, ValueError):
+        return {}
+    return {
+        payload["cpt_code"]: index.embeddings[row]
+        for row, payload in enumerate(index.payloads)
+    }
+
+
+@dataclass
+class PipelineSettings:
+    embed_batch: int = INGEST_EMBED_BATCH
+    upsert_chunk: int = INGEST_CHUNK_SIZE
+    workers: int = INGEST_UPSERT_WORKERS
+    queue_depth: int = INGEST_QUEUE_DEPTH
+
+
+class IngestJournal:
+    """
+    Chunks upserted by an unfinished run, so a crashed ingest can resume.
+
+    run.json records whether the run is a full rebuild. Each upserted chunk
+    is saved as one .npz (codes, row hashes, vectors) after Cortex accepts
+    it; deletions are appended to deleted.txt. The directory is removed once
+    the run's state file is saved.
+    """
+
+    RUN_FILE = "run.json"
+
+    def __init__(self, directory: str = INGEST_JOURNAL_DIR):
+        self.directory = directory
+
+    def start(self, full: bool) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.RUN_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"full": full}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def unfinished_full(self) -> Optional[bool]:
+        """Whether an unfinished run was a full rebuild; None if there is none."""
+        if not os.path.isdir(self.directory):
+            return None
+        try:
+            with open(os.path.join(self.directory, self.RUN_FILE)) as f:
+                return bool(json.load(f).get("full"))
+        except (OSError, ValueError):
+            return False
+
+    def has_progress(self) -> bool:
+        """True once any chunk or deletion has been recorded."""
+        return os.path.isdir(self.directory) and any(
+            name.endswith(".npz") or name == "deleted.txt"
+            for name in os.listdir(self.directory)
         )
 
-        # Prepare data — handle NaN and ensure CPT codes are strings
-        df["Procedure Code Descriptions"] = df["Procedure Code Descriptions"].fillna("")
-        df["CPT Codes"] = df["CPT Codes"].astype(str)
+    def record_chunk(self, codes: List[str], hashes: List[str], vectors) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"chunk-{uuid.uuid4().hex}.npz")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                codes=np.array(codes, dtype=str),
+                hashes=np.array(hashes, dtype=str),
+                vectors=np.asarray(vectors, dtype=np.float32),
+            )
+        os.replace(tmp_path, path)
+
+    def record_deleted(self, code: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "deleted.txt"), "a") as f:
+            f.write(code + "\n")
+
+    def load(self):
+        """Return (hashes, vectors, deleted codes) recorded by an earlier run."""
+        hashes: Dict[str, str] = {}
+        vectors: Dict[str, np.ndarray] = {}
+        deleted: set = set()
+        if not os.path.isdir(self.directory):
+            return hashes, vectors, deleted
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".npz"):
+                with np.load(path) as chunk:
+                    for code, h, vector in zip(
+                        chunk["codes"].tolist(), chunk["hashes"].tolist(), chunk["vectors"]
+                    ):
+                        hashes[code] = h
+                        vectors[code] = vector
+            elif name == "deleted.txt":
+                with open(path) as f:
+                    deleted.update(line.strip() for line in f if line.strip())
+        return hashes, vectors, deleted
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+async def upsert_pipelined(
+    client: AsyncCortexClient,
+    collection: str,
+    keys: List[str],
+    payloads: Dict[str, dict],
+    text_field: str,
+    settings: PipelineSettings,
+    hashes: Optional[Dict[str, str]] = None,
+    journal: Optional[IngestJournal] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Embed and upsert `keys` as a pipeline; returns the new vectors.
+
+    One stage embeds batches of settings.embed_batch rows (in a worker thread,
+    so the event loop keeps driving upserts) and puts them on a bounded queue;
+    settings.workers upsert tasks drain it in chunks of settings.upsert_chunk.
+    The queue bound caps how many embedded rows wait in memory.
+    """
+    if not keys:
+        return {}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.queue_depth)
+    vectors: Dict[str, np.ndarray] = {}
+    progress = {"embedded": 0, "upserted": 0, "embed_seconds": 0.0}
+    started = time.perf_counter()
 
-        descriptions_cpt = df["Procedure Code Descriptions"].tolist()
+    async def embed_stage():
+        for start in range(0, len(keys), settings.embed_batch):
+            batch = keys[start : start + settings.embed_batch]
+            texts = [payloads[k][text_field] for k in batch]
+            t0 = time.perf_counter()
+            embeddings = await asyncio.to_thread(
+                get_model().encode, texts, batch_size=len(texts)
+            )
+            progress["embed_seconds"] += time.perf_counter() - t0
+            progress["embedded"] += len(batch)
+            step = settings.upsert_chunk
+            for i in range(0, len(batch), step):
+                await queue.put((batch[i : i + step], embeddings[i : i + step]))
+        for _ in range(settings.workers):
+            await queue.put(None)
 
-        # Embed all procedure descriptions
-        print(f"Embedding {len(descriptions_cpt)} CPT procedure descriptions...")
-        embeddings_cpt = embed_model.encode(descriptions_cpt, show_progress_bar=True)
+    async def upsert_stage():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            chunk, embeddings = item
+            await client.batch_upsert(  # type: ignore[arg-type]
+                collection,
+                [stable_id(k) for k in chunk],
+                [emb.tolist() for emb in embeddings],
+                [payloads[k] for k in chunk],
+            )
+            if journal is not None and hashes is not None:
+                journal.record_chunk(chunk, [hashes[k] for k in chunk], embeddings)
+            vectors.update(zip(chunk, embeddings))
+            progress["upserted"] += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(
+                f"  {collection}: upserted {progress['upserted']}/{len(keys)} "
+                f"({progress['upserted'] / elapsed:.0f} rows/s)",
+                flush=True,
+            )
 
-        # Build metadata payloads for filtering
-        payloads_cpt = [
-            {
-                "procedure_code_category": row["Procedure Code Category"],
-                "cpt_code": row["CPT Codes"],
-                "procedure_code_description": row["Procedure Code Descriptions"],
-            }
-            for _, row in df.iterrows()
-        ]
+    tasks = [asyncio.create_task(embed_stage())] + [
+        asyncio.create_task(upsert_stage()) for _ in range(settings.workers)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # If one stage failed, stop the others instead of leaving them blocked
+        # on the queue.
+        for task in tasks:
+            task.cancel()
 
-        # Batch upsert into Actian VectorAI
-        ids_cpt = list(range(len(df)))
-        vectors_cpt = [emb.tolist() for emb in embeddings_cpt]
+    elapsed = time.perf_counter() - started
+    embed_rate = progress["embedded"] / max(progress["embed_seconds"], 1e-9)
+    print(
+        f"✓ {collection}: {len(keys)} rows in {elapsed:.2f}s "
+        f"({len(keys) / elapsed:.0f} rows/s overall, embedding {embed_rate:.0f} rows/s)"
+    )
+    return vectors
 
-        await client.batch_upsert(COLLECTION_CPT, ids_cpt, vectors_cpt, payloads_cpt)  # type: ignore[arg-type]
-        print(f"✓ Upserted {len(ids_cpt)} vectors into '{COLLECTION_CPT}'")
 
-        # ── Collection 2: procedure_index (Sheet 1 — 39 rows) ────────────────────────
-        await client.get_or_create_collection(
-            COLLECTION_PROC, dimension=DIMENSION, distance_metric=DistanceMetric.COSINE
+async def delete_points(
+    client: AsyncCortexClient,
+    collection: str,
+    keys: List[str],
+    journal: Optional[IngestJournal] = None,
+) -> None:
+    for key in keys:
+        await client.delete(collection, stable_id(key))
+        if journal is not None:
+            journal.record_deleted(key)
+    if keys:
+        print(f"  {collection}: deleted {len(keys)} removed rows")
+
+
+async def ingest_cpt(
+    client: AsyncCortexClient,
+    payloads: Dict[str, dict],
+    old_hashes: Dict[str, str],
+    settings: PipelineSettings,
+    journal: IngestJournal,
+) -> Dict[str, str]:
+    hashes = {code: row_hash(p) for code, p in payloads.items()}
+    cached = previous_vectors()
+    # Rows a crashed run already upserted count as ingested.
+    done_hashes, done_vectors, done_deleted = journal.load()
+    if done_hashes or done_deleted:
+        print(
+            f"Resuming: {len(done_hashes)} rows upserted and {len(done_deleted)} "
+            f"deleted by an unfinished run"
         )
+    old_hashes = {**old_hashes, **done_hashes}
+    cached.update(done_vectors)
+    # A row also needs embedding if its vector is missing from the local export.
+    changed = [
+        code
+        for code, h in hashes.items()
+        if old_hashes.get(code) != h or code not in cached
+    ]
+    removed = [
+        code for code in old_hashes if code not in payloads and code not in done_deleted
+    ]
+    print(
+        f"{COLLECTION_CPT}: {len(payloads)} rows, {len(changed)} new/changed, "
+        f"{len(removed)} removed"
+    )
+
+    await delete_points(client, COLLECTION_CPT, removed, journal)
+    vectors = await upsert_pipelined(
+        client,
+        COLLECTION_CPT,
+        changed,
+        payloads,
+        "procedure_code_description",
+        settings,
+        hashes,
+        journal,
+    )
+
+    if changed or removed or done_hashes or done_deleted:
+        # Same vectors for the in-process NumPy index (see local_index.py)
+        codes = list(payloads)
+        matrix = np.stack([vectors[c] if c in vectors else cached[c] for c in codes])
+        local_version = export_index(matrix, [payloads[c] for c in codes])
+        print(f"✓ Exported local CPT index (version {local_version})")
+    return hashes
+
+
+async def ingest_procedures(
+    client: AsyncCortexClient,
+    payloads: Dict[str, dict],
+    old_keys: List[str],
+    full: bool,
+    settings: PipelineSettings,
+) -> List[str]:
+    # Stamp every payload with a content hash so cached catalogs can tell
+    # they are out of date (see procedure_catalog.py)
+    entries = list(payloads.values())
+    catalog_version = row_hash({"entries": entries})
+    if not full and catalog_version == read_manifest_version():
+        print(f"{COLLECTION_PROC}: unchanged (version {catalog_version})")
+        return list(payloads)
 
-        # Normalize the double-space column name from the Excel sheet
-        index_df.columns = [c.strip().replace("  ", " ") for c in index_df.columns]
+    # The version stamp lives on every payload, so any change rewrites all
+    # 39 rows; the collection is small enough that this is cheap.
+    for payload in entries:
+        payload[VERSION_FIELD] = catalog_version
+    print(f"{COLLECTION_PROC}: {len(payloads)} rows, version {catalog_version}")
+    await upsert_pipelined(
+        client,
+        COLLECTION_PROC,
+        list(payloads),
+        payloads,
+        "procedure_description",
+        settings,
+    )
+    await delete_points(
+        client, COLLECTION_PROC, [k for k in old_keys if k not in payloads]
+    )
 
-        # Prepare data
-        index_df["Procedure Description"] = index_df["Procedure Description"].fillna("")
-        descriptions_proc = index_df["Procedure Description"].tolist()
+    export_procedure_index(entries)
+    write_manifest_version(catalog_version, len(entries))
+    print(f"✓ Catalog version {catalog_version} written to manifest")
+    return list(payloads)
 
-        # Embed procedure descriptions
-        print(f"Embedding {len(descriptions_proc)} procedure index descriptions...")
-        embeddings_proc = embed_model.encode(descriptions_proc, show_progress_bar=True)
 
-        # Build metadata payloads
-        payloads_proc = [
-            {
-                "procedure_code_category": row["Procedure Code Category"],
-                "operative_procedure": row["Operative Procedure"],
-                "procedure_description": row["Procedure Description"],
-            }
-            for _, row in index_df.iterrows()
-        ]
+async def main(full: bool = False, settings: Optional[PipelineSettings] = None):
+    settings = settings or PipelineSettings()
+    df, index_df = load_workbook()
+    cpt = cpt_payloads(df)
+    procedures = procedure_payloads(index_df)
+    print(f"Rows loaded: {len(cpt)} CPT codes, {len(procedures)} procedure categories")
 
-        # Batch upsert
-        ids_proc = list(range(len(index_df)))
-        vectors_proc = [emb.tolist() for emb in embeddings_proc]
+    journal = IngestJournal()
+    if full:
+        journal.clear()
+    resumed_full = journal.unfinished_full()
+    if resumed_full is not None:
+        # Finish the interrupted run as the kind of run it was: a full
+        # rebuild must not diff against the state of collections it dropped.
+        full = resumed_full
+    state = None if full else load_state()
+    if state is None:
+        # No state (first run, or --full): earlier ingests used row-index IDs,
+        # so start both collections from scratch.
+        full = True
+        state = {}
+    # Dropping again would lose the chunks a resumed rebuild already upserted.
+    drop = full and not journal.has_progress()
+    journal.start(full)
 
-        await client.batch_upsert(COLLECTION_PROC, ids_proc, vectors_proc, payloads_proc)  # type: ignore[arg-type]
-        print(f"✓ Upserted {len(ids_proc)} vectors into '{COLLECTION_PROC}'")
+    async with AsyncCortexClient("localhost:50051") as client:
+        for collection in (COLLECTION_CPT, COLLECTION_PROC):
+            if drop:
+                try:
+                    await client.delete_collection(collection)
+                except Exception as e:
+                    print(f"{collection}: not dropped ({e})")
+            # Create collection (idempotent — safe to re-run)
+            await client.get_or_create_collection(
+                collection, dimension=DIMENSION, distance_metric=DistanceMetric.COSINE
+            )
+
+        cpt_hashes = await ingest_cpt(
+            client, cpt, state.get(COLLECTION_CPT, {}), settings, journal
+        )
+        procedure_keys = await ingest_procedures(
+            client, procedures, state.get(COLLECTION_PROC, []), full, settings
+        )
+
+    # Written last: if anything above failed, the next run resumes from the
+    # journal and retries the rest.
+    save_state({COLLECTION_CPT: cpt_hashes, COLLECTION_PROC: procedure_keys})
+    journal.clear()
+    print("✓ Ingestion state saved")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Ingest the CPT workbook into Cortex")
+    parser.add_argument(
+        "--full", action="store_true", help="drop both collections and re-ingest"
+    )
+    parser.add_argument("--embed-batch", type=int, default=INGEST_EMBED_BATCH)
+    parser.add_argument("--upsert-chunk", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_UPSERT_WORKERS)
+    parser.add_argument("--queue-depth", type=int, default=INGEST_QUEUE_DEPTH)
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            full=args.full,
+            settings=PipelineSettings(
+                embed_batch=args.embed_batch,
+                upsert_chunk=args.upsert_chunk,
+                workers=args.workers,
+                queue_depth=args.queue_depth,
+            ),
+        )
+    )
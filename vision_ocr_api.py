@@ -1,5 +1,6 @@
 from groq import Groq
 from flask import Flask, jsonify, request
+from llm_cache import INSURANCE_CACHE_TTL_SECONDS, cached_completion
 import base64
 import json
 import os
@@ -73,7 +74,12 @@ def extract_insurance_info():
 
     client = get_client()
 
-    chat_completion = client.chat.completions.create(
+    content = cached_completion(
+        "vision_ocr_extract",
+        client,
+        # Extracted member details are PHI: short TTL, never on disk.
+        ttl_seconds=INSURANCE_CACHE_TTL_SECONDS,
+        persist=False,
         messages=[
             {
                 "role": "user",
@@ -97,8 +103,6 @@ def extract_insurance_info():
         },
         model=MODEL_NAME,
     )
-
-    content = chat_completion.choices[0].message.content
     try:
         return jsonify(json.loads(content))
     except json.JSONDecodeError:
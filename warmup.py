@@ -0,0 +1,225 @@
+"""
+Per-process warm-up and readiness.
+
+`start_warm_up()` runs every component's warm-up once in a background thread:
+it opens and pings the Cortex pool, loads the procedure catalog, runs a dummy
+encode, builds the category router and CPT lookup index, maps the local index
+and pricing table, loads the charity model, and creates the Groq client.
+`readiness()` reports each component's status and timing; GET /ready returns
+503 until every component in READY_COMPONENTS is warm, so a load balancer
+only routes to warm workers.
+
+Cortex is not required by default: searches fall back to the local index
+(see cpt_search.retrieve), so a Cortex outage should not take every worker
+out of rotation. Add it to READY_COMPONENTS to make it required.
+"""
+
+from cortex_pool import get_pool, run
+from charity_model import get_charity_model
+from cpt_lookup import get_cpt_lookup
+from category_router import get_router
+from embedding_service import encode, encode_many, preload
+from llm_cache import llm_cache_stats
+from local_index import get_local_index
+from pricing import get_client as pricing_client
+from pricing_table import get_pricing_table
+from procedure_catalog import get_catalog, load_catalog
+from typing import Callable, Dict, List, Optional
+import asyncio
+import os
+import threading
+import time
+
+READY_COMPONENTS = [
+    name.strip()
+    for name in os.environ.get(
+        "READY_COMPONENTS",
+        "procedure_catalog,embedding_model,category_router,llm_client",
+    ).split(",")
+    if name.strip()
+]
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", "30"))
+# /ready retries failed components at most this often.
+WARMUP_RETRY_SECONDS = float(os.environ.get("WARMUP_RETRY_SECONDS", "15"))
+
+
+def _warm_cortex() -> str:
+    pool = get_pool()
+
+    async def ping_all():
+        # Concurrent pings check out every slot, so each connection is opened.
+        await asyncio.gather(
+            *(
+                pool.call(lambda client: client.health_check())
+                for _ in range(pool.size)
+            )
+        )
+
+    run(ping_all(), timeout=WARMUP_TIMEOUT_SECONDS)
+    return f"{pool.size} connections"
+
+
+def _warm_catalog() -> str:
+    entries = load_catalog()
+    return f"{len(entries)} entries"
+
+
+def _warm_embedding_model() -> str:
+    preload()
+    # The first forward pass initialises torch's thread pool and kernels;
+    # the second goes through the micro-batcher, starting its worker thread.
+    encode_many(["warm-up"])
+    encode("warm-up query")
+    return "encoded"
+
+
+def _warm_router() -> str:
+    # Same entries object the search path gets, so the router is reused.
+    entries = run(get_catalog().get_entries(), timeout=WARMUP_TIMEOUT_SECONDS)
+    router = get_router(entries, encode_many)
+    return f"{len(router.categories)} categories"
+
+
+def _warm_local_index() -> str:
+    index = get_local_index()
+    return f"{len(index)} rows" if index is not None else "not exported"
+
+
+def _warm_cpt_lookup() -> str:
+    return f"{len(get_cpt_lookup())} codes"
+
+
+def _warm_pricing_table() -> str:
+    table = get_pricing_table()
+    return f"{len(table)} codes" if table is not None else "not built"
+
+
+def _warm_charity_model() -> str:
+    model = get_charity_model()
+    return f"{len(model)} trees" if model is not None else "not trained"
+
+
+def _warm_llm_client() -> str:
+    pricing_client()
+    # Opens the completion cache's SQLite connection for this process.
+    llm_cache_stats()
+    return "client created"
+
+
+# Run in this order: the router needs the catalog and the model.
+WARMUP_STEPS: List[tuple] = [
+    ("cortex", _warm_cortex),
+    ("procedure_catalog", _warm_catalog),
+    ("embedding_model", _warm_embedding_model),
+    ("category_router", _warm_router),
+    ("local_index", _warm_local_index),
+    ("cpt_lookup", _warm_cpt_lookup),
+    ("pricing_table", _warm_pricing_table),
+    ("charity_model", _warm_charity_model),
+    ("llm_client", _warm_llm_client),
+]
+
+
+class WarmUp:
+    def __init__(self, steps: List[tuple] = WARMUP_STEPS):
+        self.steps = steps
+        self._lock = threading.Lock()
+        self._components: Dict[str, dict] = {
+            name: {"status": "pending"} for name, _ in steps
+        }
+        self._running = False
+        self._last_run = 0.0
+
+    def _run_step(self, name: str, fn: Callable[[], str]) -> None:
+        with self._lock:
+            self._components[name] = {"status": "warming"}
+        started = time.perf_counter()
+        try:
+            detail = fn()
+            result = {"status": "ready", "detail": detail}
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+        with self._lock:
+            self._components[name] = result
+
+    def run(self, only: Optional[List[str]] = None) -> None:
+        """Warm every step (or just `only`), in order, on the calling thread."""
+        with self._lock:
+            self._last_run = time.monotonic()
+        for name, fn in self.steps:
+            if only is None or name in only:
+                self._run_step(name, fn)
+        with self._lock:
+            self._running = False
+
+    def start(self, only: Optional[List[str]] = None) -> bool:
+        """Run `run` in a daemon thread unless one is already going."""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(
+            target=self.run, args=(only,), name="warm-up", daemon=True
+        ).start()
+        return True
+
+    def report(self) -> dict:
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+            running = self._running
+            last_run = self._last_run
+        failed = [
+            name
+            for name in READY_COMPONENTS
+            if components.get(name, {}).get("status") == "error"
+        ]
+        retry_due = time.monotonic() - last_run >= WARMUP_RETRY_SECONDS
+        if failed and not running and retry_due:
+            self.start(only=failed)
+            running = True
+        return {
+            "ready": all(
+                components.get(name, {}).get("status") == "ready"
+                for name in READY_COMPONENTS
+            ),
+            "required": READY_COMPONENTS,
+            "warming": running,
+            "pid": os.getpid(),
+            "components": components,
+        }
+
+
+_warm_up: Optional[WarmUp] = None
+_warm_up_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _get() -> WarmUp:
+    # State is per process: a worker forked from a warmed master still has
+    # to warm its own threads and connections.
+    global _warm_up, _warm_up_pid
+    with _lock:
+        if _warm_up is None or _warm_up_pid != os.getpid():
+            _warm_up = WarmUp()
+            _warm_up_pid = os.getpid()
+        return _warm_up
+
+
+def start_warm_up() -> bool:
+    return _get().start()
+
+
+def readiness() -> dict:
+    return _get().report()
+
+
+if __name__ == "__main__":
+    # Warm everything in the foreground and print the timings.
+    warm_up = _get()
+    warm_up.run()
+    report = warm_up.report()
+    for name, component in report["components"].items():
+        status = component.get("detail") or component.get("error", "")
+        print(f"{name:18} {component['status']:8} {component['ms']:10.2f} ms  {status}")
+    print("ready" if report["ready"] else "NOT ready")